@@ -1,2 +1,2 @@
-CREATE DATABASE orders_db;
-CREATE DATABASE payments_db;
+CREATE DATABASE orders_db;
+CREATE DATABASE payments_db;
@@ -0,0 +1,200 @@
+import os, math, time, logging, threading
+import pika
+import events
+import outbox
+from metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+# Controle de admissão do POST /orders. Uma thread amostra o atraso do lado de
+# pagamentos (profundidade das filas por passive declare, pendências e idade
+# do outbox) e cada sinal vira uma pressão entre a marca baixa (0) e a alta
+# (1). Abaixo da baixa o pedido entra direto; entre as duas entra depois de um
+# atraso proporcional; acima da alta recebe 429 com Retry-After.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_QUEUES = [q for q in os.getenv("ADMISSION_QUEUES", "payments.orders").split(",") if q]
+ADMISSION_QUEUE_LOW = int(os.getenv("ADMISSION_QUEUE_LOW", "5000"))
+ADMISSION_QUEUE_HIGH = int(os.getenv("ADMISSION_QUEUE_HIGH", "20000"))
+ADMISSION_OUTBOX_LOW = int(os.getenv("ADMISSION_OUTBOX_LOW", "2000"))
+ADMISSION_OUTBOX_HIGH = int(os.getenv("ADMISSION_OUTBOX_HIGH", "10000"))
+ADMISSION_LAG_LOW_MS = float(os.getenv("ADMISSION_LAG_LOW_MS", "2000"))
+ADMISSION_LAG_HIGH_MS = float(os.getenv("ADMISSION_LAG_HIGH_MS", "10000"))
+ADMISSION_MAX_DELAY_MS = float(os.getenv("ADMISSION_MAX_DELAY_MS", "200"))
+ADMISSION_POLL_INTERVAL = float(os.getenv("ADMISSION_POLL_INTERVAL", "1"))
+ADMISSION_RETRY_AFTER_MAX = int(os.getenv("ADMISSION_RETRY_AFTER_MAX", "30"))
+
+ADMIT, DELAY, REJECT = "admitted", "delayed", "rejected"
+
+
+def physical_queues(queue: str) -> list[str]:
+    # ADMISSION_QUEUES lista as filas lógicas; com CONSUMER_PARTITIONS (ou
+    # CONSUMER_<FILA>_PARTITIONS) igual ao do consumer, lê as N partições
+    partitions = events._queue_setting(queue, "PARTITIONS", events.CONSUMER_PARTITIONS)
+    if partitions > 0:
+        return [events.partition_queue_name(queue, i) for i in range(partitions)]
+    return [queue]
+
+
+class _Signal:
+    __slots__ = ("name", "low", "high", "value", "drain_rate")
+
+    def __init__(self, name: str, low: float, high: float):
+        self.name = name
+        self.low = low
+        self.high = max(high, low + 1)
+        self.value = 0.0
+        self.drain_rate = 0.0  # quanto o valor cai por segundo (média móvel)
+
+    def update(self, value: float, elapsed: float):
+        if elapsed > 0:
+            self.drain_rate = 0.7 * self.drain_rate + 0.3 * (self.value - value) / elapsed
+        self.value = value
+
+    @property
+    def pressure(self) -> float:
+        return (self.value - self.low) / (self.high - self.low)
+
+    def seconds_to_low(self) -> float:
+        # sem tendência de queda, quem tentar de novo logo vai bater no mesmo limite
+        excess = self.value - self.low
+        if excess <= 0:
+            return 0.0
+        return excess / self.drain_rate if self.drain_rate > 0 else ADMISSION_RETRY_AFTER_MAX
+
+
+class AdmissionController:
+    def __init__(self, queues: list[str] = ADMISSION_QUEUES, enabled: bool = ADMISSION_ENABLED,
+                 max_delay_ms: float = ADMISSION_MAX_DELAY_MS, poll_interval: float = ADMISSION_POLL_INTERVAL):
+        self.queues = queues
+        self.enabled = enabled
+        self.max_delay = max_delay_ms / 1000
+        self.poll_interval = poll_interval
+        self.signals = {
+            "queue_depth": _Signal("queue_depth", ADMISSION_QUEUE_LOW, ADMISSION_QUEUE_HIGH),
+            "outbox_pending": _Signal("outbox_pending", ADMISSION_OUTBOX_LOW, ADMISSION_OUTBOX_HIGH),
+            "outbox_lag_ms": _Signal("outbox_lag_ms", ADMISSION_LAG_LOW_MS, ADMISSION_LAG_HIGH_MS),
+        }
+        self.pressure = 0.0
+        self.sampled_at = None
+        self.decisions = {ADMIT: 0, DELAY: 0, REJECT: 0}
+        self._conn = None
+        self._ch = None
+        self._thread = None
+        self._broker_ok = True
+        self.missing_queues: set = set()
+
+    def update(self, queue_depth: int, outbox_pending: int, outbox_lag_ms: float, now: float = None):
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.sampled_at if self.sampled_at is not None else 0
+        for name, value in (("queue_depth", queue_depth), ("outbox_pending", outbox_pending),
+                            ("outbox_lag_ms", outbox_lag_ms)):
+            self.signals[name].update(value, elapsed)
+        self.sampled_at = now
+        self.pressure = max(s.pressure for s in self.signals.values())
+
+    def decide(self) -> tuple[str, float]:
+        # (decisão, segundos): atraso para DELAY, Retry-After para REJECT
+        if not self.enabled or self.pressure <= 0:
+            decision, seconds = ADMIT, 0.0
+        elif self.pressure < 1:
+            decision, seconds = DELAY, self.pressure * self.max_delay
+        else:
+            decision, seconds = REJECT, self.retry_after()
+        self.decisions[decision] += 1
+        return decision, seconds
+
+    def retry_after(self) -> int:
+        seconds = max(s.seconds_to_low() for s in self.signals.values() if s.pressure >= 1)
+        return max(1, min(ADMISSION_RETRY_AFTER_MAX, math.ceil(seconds)))
+
+    def _message_count(self, queue: str):
+        # None se a fila não existe: o passive declare fecha o canal
+        try:
+            return self._ch.queue_declare(queue=queue, passive=True).method.message_count
+        except pika.exceptions.ChannelClosedByBroker:
+            self._ch = self._conn.channel()
+            return None
+
+    def _queue_depth(self) -> int:
+        if self._ch is None or not self._ch.is_open:
+            if self._conn is None or not self._conn.is_open:
+                self._conn = events._connection()
+            self._ch = self._conn.channel()
+        depth, missing = 0, set()
+        for queue in self.queues:
+            # fila particionada: as marcas valem para a soma das partições
+            total = 0
+            for physical in physical_queues(queue):
+                count = self._message_count(physical)
+                if count is None:
+                    missing.add(physical)
+                else:
+                    total += count
+            depth = max(depth, total)
+        for queue in sorted(missing - self.missing_queues):
+            logger.warning("admissão: fila %s não existe; profundidade dela fica de fora", queue)
+        for queue in sorted(self.missing_queues - missing):
+            logger.info("admissão: fila %s voltou a ser amostrada", queue)
+        self.missing_queues = missing
+        return depth
+
+    def sample(self):
+        try:
+            depth = self._queue_depth()
+            if not self._broker_ok:
+                logger.info("admissão: leitura das filas normalizada")
+            self._broker_ok = True
+        except Exception as e:
+            # sem broker o publish falha e o outbox cresce: esse sinal continua valendo
+            if self._broker_ok:
+                logger.warning("admissão: não foi possível ler a profundidade das filas: %s", e)
+            self._broker_ok = False
+            self._conn = self._ch = None
+            depth = 0
+        st = outbox.stats()
+        self.update(depth, st["pending"], st["oldest_pending_age_ms"])
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return self
+
+        def _run():
+            while True:
+                try:
+                    self.sample()
+                except Exception as e:
+                    logger.warning("admissão: amostragem falhou: %s", e)
+                time.sleep(self.poll_interval)
+
+        self._thread = threading.Thread(target=_run, name="admission-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pressure": round(self.pressure, 3),
+            "sampled_at_age_s": round(time.monotonic() - self.sampled_at, 3) if self.sampled_at else None,
+            "broker_ok": self._broker_ok,
+            "missing_queues": sorted(self.missing_queues),
+            "signals": {n: {"value": s.value, "low": s.low, "high": s.high, "drain_rate": round(s.drain_rate, 2)}
+                        for n, s in self.signals.items()},
+            "decisions": dict(self.decisions),
+        }
+
+
+controller = AdmissionController()
+
+
+@register_collector
+def _admission_metrics():
+    return [
+        ("admission_pressure", "gauge", "Pressão do controle de admissão (>=1 rejeita com 429)",
+         [({}, controller.pressure)]),
+        ("admission_signal", "gauge", "Sinais amostrados pelo controle de admissão",
+         [({"signal": n}, s.value) for n, s in controller.signals.items()]),
+        ("admission_decisions_total", "counter", "Decisões do POST /orders por resultado",
+         [({"decision": d}, c) for d, c in controller.decisions.items()]),
+        ("admission_missing_queues", "gauge", "Filas de ADMISSION_QUEUES que não existem no broker",
+         [({}, len(controller.missing_queues))]),
+    ]
@@ -0,0 +1,321 @@
+import asyncio, functools, time, logging
+import aio_pika
+import aiormq.exceptions
+import codec
+import tracing
+import events
+from events import (RABBITMQ_URL, EXCHANGE, DLX, CONSUMER_PREFETCH, CONSUMER_BATCH_SIZE, CONSUMER_BATCH_LINGER_MS,
+                    CONSUMER_RETRY_DELAYS_MS, CONSUMER_PARTITIONS, PARTITION_KEY_HEADER, PERMANENT_ERRORS,
+                    retry_queue_name, parking_queue_name, partition_queue_name, partition_exchange_name,
+                    _queue_setting, _WorkerStats)
+from metrics import PUBLISH_SECONDS, PUBLISH_RETRIES
+logger = logging.getLogger(__name__)
+
+# Equivalente asyncio (aio-pika) do events.py para o modo asgi. Mesmo exchange,
+# mesmas filas de retry/parking e mesmos headers, então os dois modos convivem.
+
+def _message(payload: dict, headers: dict = None) -> aio_pika.Message:
+    headers = codec.headers(headers)
+    headers[tracing.PUBLISHED_AT_HEADER] = time.time()
+    if payload.get("order_id"):
+        headers[PARTITION_KEY_HEADER] = str(payload["order_id"])
+    return aio_pika.Message(
+        codec.encode(payload),
+        content_type=codec.CONTENT_TYPE,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        headers=headers,
+    )
+
+class AsyncPublisher:
+    # Uma conexão robusta e um canal em confirm mode. No asyncio os publishes
+    # concorrentes esperam seus confirms em paralelo no mesmo canal, então não
+    # há pool: o limite é o número de confirms pendentes, não de canais.
+    def __init__(self, url: str = RABBITMQ_URL):
+        self.url = url
+        self._conn = None
+        self._exchange = None
+        self._lock = asyncio.Lock()
+
+    async def _get_exchange(self):
+        if self._exchange is None:
+            async with self._lock:
+                if self._exchange is None:
+                    self._conn = await aio_pika.connect_robust(self.url)
+                    ch = await self._conn.channel(publisher_confirms=True)
+                    self._exchange = await ch.declare_exchange(EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True)
+        return self._exchange
+
+    async def _with_retries(self, name: str, routing_key: str, fn, max_retries: int):
+        delay = 0.5
+        for attempt in range(1, max_retries + 1):
+            try:
+                return await fn()
+            except Exception as e:
+                logger.warning("%s falhou (tentativa %s/%s): %s", name, attempt, max_retries, e)
+                if attempt == max_retries:
+                    raise
+                PUBLISH_RETRIES.labels(routing_key).inc()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 8)
+
+    async def publish(self, routing_key: str, payload: dict, max_retries: int = 3):
+        async def _send():
+            exchange = await self._get_exchange()
+            await exchange.publish(_message(payload, tracing.inject({})), routing_key=routing_key)
+
+        with tracing.span(f"publish {routing_key}"), PUBLISH_SECONDS.labels(routing_key).time():
+            await self._with_retries("publish_event", routing_key, _send, max_retries)
+
+    async def publish_many(self, items: list[tuple], max_retries: int = 3):
+        # itens (routing_key, payload[, headers]), como em events.publish_events;
+        # todos são enviados antes de esperar os confirms
+        async def _send():
+            exchange = await self._get_exchange()
+            await asyncio.gather(*[
+                exchange.publish(_message(e[1], e[2] if len(e) > 2 else None), routing_key=e[0])
+                for e in items
+            ])
+
+        if items:
+            with PUBLISH_SECONDS.labels("<batch>").time():
+                await self._with_retries("publish_events", "<batch>", _send, max_retries)
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = self._exchange = None
+
+async def declare_topology(ch, queue: str, binding_keys: list[str], retry_delays_ms: list[int], limits: bool = True,
+                           exchange=None, arguments: dict = None):
+    # mesma topologia de events.declare_topology; limits=False não redeclara
+    # a fila principal (ela já existe com outros argumentos)
+    if exchange is None:
+        exchange = await ch.declare_exchange(EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True)
+    dlx = await ch.declare_exchange(DLX, aio_pika.ExchangeType.DIRECT, durable=True)
+    if arguments is None:
+        arguments = events.queue_arguments(queue)
+    if limits:
+        main = await ch.declare_queue(queue, durable=True, arguments=arguments or None)
+    else:
+        main = await ch.declare_queue(queue, passive=True)
+    for key in binding_keys:
+        await main.bind(exchange, routing_key=key)
+    for delay_ms in retry_delays_ms:
+        name = retry_queue_name(queue, delay_ms)
+        q = await ch.declare_queue(name, durable=True, arguments={
+            "x-message-ttl": delay_ms,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": queue,
+        })
+        await q.bind(dlx, routing_key=name)
+    parking = await ch.declare_queue(parking_queue_name(queue), durable=True)
+    await parking.bind(dlx, routing_key=parking.name)
+    return main, dlx
+
+async def declare_partitions(ch, queue: str, binding_keys: list[str], partitions: int, retry_delays_ms: list[int],
+                             limits: bool = True):
+    # mesma topologia de events.declare_partitions; retorna as filas das partições
+    exchange = await ch.declare_exchange(EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True)
+    hash_exchange = await ch.declare_exchange(partition_exchange_name(queue), aio_pika.ExchangeType.X_CONSISTENT_HASH,
+                                              durable=True, arguments={"hash-header": PARTITION_KEY_HEADER})
+    for key in binding_keys:
+        await hash_exchange.bind(exchange, routing_key=key)
+    arguments = {**events.queue_arguments(queue), "x-single-active-consumer": True}
+    queues = []
+    for p in range(partitions):
+        q, dlx = await declare_topology(ch, partition_queue_name(queue, p), ["1"], retry_delays_ms, limits=limits,
+                                        exchange=hash_exchange, arguments=arguments)
+        queues.append(q)
+    return queues, dlx
+
+class AsyncConsumer:
+    # Um canal consumindo a fila no loop do processo. Com batch_handler as
+    # mensagens são agrupadas por batch_size/batch_linger_ms e confirmadas com
+    # um ack multiple; lote com falha é reprocessado mensagem a mensagem.
+    # Fica registrado em events._consumers para /consumers/stats e /metrics.
+    # Com partições o canal se inscreve em todas e o x-single-active-consumer
+    # decide quem recebe cada uma: ordem garantida, mas sem o rebalanceamento
+    # por heartbeat do events.Consumer.
+    def __init__(self, queue: str, binding_keys: list[str], handler=None, batch_handler=None,
+                 batch_size: int = None, batch_linger_ms: float = None, prefetch: int = None,
+                 retry_delays_ms: list[int] = None, partitions: int = None, url: str = RABBITMQ_URL):
+        self.queue = queue
+        self.binding_keys = binding_keys
+        self.handler = handler
+        self.batch_handler = batch_handler
+        self.batch_size = max(1, batch_size or _queue_setting(queue, "BATCH_SIZE", CONSUMER_BATCH_SIZE))
+        self.batch_linger_ms = batch_linger_ms or _queue_setting(queue, "BATCH_LINGER_MS", CONSUMER_BATCH_LINGER_MS, float)
+        self.prefetch = prefetch or _queue_setting(queue, "PREFETCH", CONSUMER_PREFETCH)
+        self.retry_delays_ms = CONSUMER_RETRY_DELAYS_MS if retry_delays_ms is None else retry_delays_ms
+        self.partitions = _queue_setting(queue, "PARTITIONS", CONSUMER_PARTITIONS) if partitions is None else partitions
+        self.url = url
+        self.workers = [_WorkerStats(queue, 0)]
+        self._conn = None
+        self._dlx = None
+        self._task = None
+        self._pending: list[tuple] = []
+        self._flush_handle = None
+        self._flushing = asyncio.Lock()
+
+    def start(self):
+        # como no events.Consumer: retorna na hora e conecta/reconecta em background
+        self._task = asyncio.get_running_loop().create_task(self._connect(), name=f"consumer-{self.queue}")
+        events._consumers.append(self)
+        return self
+
+    async def _connect(self):
+        while True:
+            try:
+                self._conn = await aio_pika.connect_robust(self.url)
+                self._conn.reconnect_callbacks.add(self._on_reconnect)
+                ch = await self._conn.channel()
+                try:
+                    queues, self._dlx = await self._declare(ch)
+                except aiormq.exceptions.ChannelPreconditionFailed as e:
+                    # como em events.declare_topology: a fila existente fica
+                    # como está; o PRECONDITION_FAILED fechou o canal
+                    logger.warning("fila %s já existe com outros argumentos; mantendo os atuais (%s)", self.queue, e)
+                    ch = await self._conn.channel()
+                    queues, self._dlx = await self._declare(ch, limits=False)
+                prefetch = max(self.prefetch, self.batch_size) if self.batch_handler else self.prefetch
+                await ch.set_qos(prefetch_count=prefetch)
+                for q in queues:
+                    await q.consume(functools.partial(self._on_message, queue=q.name))
+                return
+            except Exception as e:
+                self.workers[0].reconnects += 1
+                logger.warning("consumer %s desconectado: %s; tentando reconectar…", self.queue, e)
+                if self._conn is not None:
+                    await self._conn.close()
+                    self._conn = None
+                await asyncio.sleep(2)
+
+    async def _declare(self, ch, limits: bool = True):
+        if self.partitions:
+            return await declare_partitions(ch, self.queue, self.binding_keys, self.partitions, self.retry_delays_ms,
+                                            limits=limits)
+        main, dlx = await declare_topology(ch, self.queue, self.binding_keys, self.retry_delays_ms, limits=limits)
+        return [main], dlx
+
+    def _on_reconnect(self, *args):
+        self.workers[0].reconnects += 1
+        # as entregas pendentes eram do canal antigo; o broker já as devolveu
+        self._pending = []
+
+    async def _reject(self, message, error: Exception, queue: str):
+        stats = self.workers[0]
+        headers = dict(message.headers or {})
+        retries = int(headers.get("x-retry-count", 0))
+        if not isinstance(error, PERMANENT_ERRORS) and retries < len(self.retry_delays_ms):
+            target = retry_queue_name(queue, self.retry_delays_ms[retries])
+            headers["x-retry-count"] = retries + 1
+        else:
+            target = parking_queue_name(queue)
+        headers.setdefault("x-original-routing-key", message.routing_key)
+        headers["x-last-error"] = repr(error)[:500]
+        try:
+            await self._dlx.publish(
+                aio_pika.Message(message.body, content_type=message.content_type,
+                                 delivery_mode=aio_pika.DeliveryMode.PERSISTENT, headers=headers),
+                routing_key=target,
+            )
+        except Exception:
+            await message.nack(requeue=True)
+            stats.nacked += 1
+            return
+        await message.ack()
+        if target.endswith(".parking"):
+            stats.parked += 1
+        else:
+            stats.retried += 1
+
+    async def _on_message(self, message, queue: str):
+        stats = self.workers[0]
+        stats.messages += 1
+        stats.last_message_at = time.time()
+        try:
+            msg = codec.decode(message.body, message.content_type, message.headers)
+        except Exception as e:
+            await self._reject(message, e, queue)
+            return
+        parent = tracing.queue_wait(message.headers, self.queue)
+
+        if self.batch_handler:
+            self._pending.append((message, msg, parent, queue))
+            if len(self._pending) >= self.batch_size:
+                await self.flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(
+                    self.batch_linger_ms / 1000, lambda: asyncio.ensure_future(self.flush()))
+            return
+
+        t0 = time.perf_counter()
+        try:
+            with tracing.span(f"handle {self.queue}", parent=parent):
+                await self.handler(msg)
+            await message.ack()
+            stats.acked += 1
+        except Exception as e:
+            await self._reject(message, e, queue)
+        finally:
+            stats.observe_handler(time.perf_counter() - t0)
+
+    async def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        async with self._flushing:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            stats = self.workers[0]
+            t0 = time.perf_counter()
+            start = time.time()
+            try:
+                await self.batch_handler([b[1] for b in batch])
+                await batch[-1][0].ack(multiple=True)
+                stats.acked += len(batch)
+                if tracing.enabled():
+                    end = time.time()
+                    for b in batch:
+                        if b[2]:
+                            tracing.record_span(f"handle {self.queue}", b[2], start, end, batch_size=len(batch))
+            except Exception:
+                for message, msg, _, queue in batch:
+                    try:
+                        await self.batch_handler([msg])
+                        await message.ack()
+                        stats.acked += 1
+                    except Exception as e:
+                        await self._reject(message, e, queue)
+            finally:
+                stats.observe_handler(time.perf_counter() - t0)
+
+    def stop(self, timeout: float = None):
+        # chamado pelo atexit de events.stop_consumers, quando o loop já parou;
+        # o encerramento de verdade é o aclose() no shutdown do asgi
+        pass
+
+    async def aclose(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        await self.flush()
+        if self._conn is not None:
+            await self._conn.close()
+        if self in events._consumers:
+            events._consumers.remove(self)
+
+    def stats(self) -> dict:
+        return {
+            "queue": self.queue,
+            "concurrency": 1,
+            "prefetch": self.prefetch,
+            "batch_size": self.batch_size if self.batch_handler else None,
+            "partitions": self.partitions or None,
+            "membership": None,
+            "workers": [w.to_dict() for w in self.workers],
+        }
+
+def start_consumer(queue: str, binding_keys: list[str], handler=None, batch_handler=None, **kwargs) -> AsyncConsumer:
+    # precisa ser chamado de dentro do loop (ex.: lifespan do asgi)
+    return AsyncConsumer(queue, binding_keys, handler=handler, batch_handler=batch_handler, **kwargs).start()
@@ -0,0 +1,267 @@
+import os
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from sqlalchemy import insert, select
+from models import Order, OutboxEvent, engine, create_async_session_factory, pool_stats
+from orders import (ORDER_BATCH_MAX, build_order, build_batch, batch_status, parse_batch, orders_query,
+                    default_created_from, list_limit, list_page, int_arg, order_key, payment_transitions,
+                    status_updates)
+from events import consumer_stats
+from aio_events import AsyncPublisher, start_consumer
+from metrics import instrument_asgi, render
+import outbox
+import partitioning
+import tracing
+import notify
+import admission
+from cache import ORDER_CACHE_SIZE, OrderCache, shared_backend
+
+# Modo asyncio (SERVER_MODE=async): as mesmas rotas do app.py em Starlette,
+# com SQLAlchemy asyncio (asyncpg) e aio-pika. Um worker atende milhares de
+# requisições concorrentes sem prender uma thread por espera de banco/broker.
+
+logger = logging.getLogger(__name__)
+
+ORDER_WAIT_MAX = float(os.getenv("ORDER_WAIT_MAX", "30"))
+EXPORT_YIELD_PER = 1000
+WEB_CONSUMERS = os.getenv("WEB_CONSUMERS", "false").lower() in ("1", "true", "yes")
+PG_NOTIFY = notify.uses_pg(engine)
+
+# O cache local só é invalidado pelo hub deste processo. Sem LISTEN/NOTIFY
+# o hub só vê os status gravados aqui; com o consumer no worker.py as
+# entradas ficariam velhas até o TTL, então fica só a camada compartilhada.
+LOCAL_ORDER_CACHE = PG_NOTIFY or WEB_CONSUMERS or notify.ORDER_STATUS_NOTIFY == "local"
+order_cache = OrderCache(size=ORDER_CACHE_SIZE if LOCAL_ORDER_CACHE else 0, shared=shared_backend())
+# status novo (deste processo ou via LISTEN/NOTIFY): limpa só o cache local
+notify.hub.add_listener(lambda ids: order_cache.invalidate(ids, shared=False))
+
+async_engine, AsyncSessionLocal = create_async_session_factory()
+publisher = AsyncPublisher()
+
+tracing.init("service_order")
+
+def _error(status: int, description: str) -> JSONResponse:
+    return JSONResponse({"error": description}, status_code=status)
+
+async def health(request: Request):
+    return JSONResponse({"status": "ok"})
+
+async def metrics(request: Request):
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+async def db_stats(request: Request):
+    return JSONResponse(pool_stats(async_engine.sync_engine))
+
+async def consumers_stats(request: Request):
+    return JSONResponse(consumer_stats())
+
+async def admission_stats(request: Request):
+    return JSONResponse(admission.controller.stats())
+
+async def outbox_stats(request: Request):
+    # consulta curta no engine síncrono, fora do loop
+    return JSONResponse(await asyncio.to_thread(outbox.stats))
+
+async def cache_stats(request: Request):
+    return JSONResponse(order_cache.stats())
+
+async def _admit():
+    # None quando o pedido pode seguir; senão a resposta 429
+    decision, seconds = admission.controller.decide()
+    if decision == admission.REJECT:
+        resp = _error(429, "pagamentos atrasados, tente novamente mais tarde")
+        resp.headers["Retry-After"] = str(seconds)
+        return resp
+    if decision == admission.DELAY:
+        await asyncio.sleep(seconds)
+    return None
+
+async def create_order(request: Request):
+    rejected = await _admit()
+    if rejected is not None:
+        return rejected
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    try:
+        order, payload = build_order(data or {})
+    except ValueError as e:
+        return _error(400, str(e))
+
+    resp = order.to_dict()
+    async with AsyncSessionLocal() as s:
+        s.add(order)
+        s.add(OutboxEvent(routing_key="order.created", payload=payload, headers=tracing.inject({})))
+        await s.commit()
+
+    outbox.notify()
+    order_cache.put(resp)
+    return JSONResponse(resp, status_code=201)
+
+async def create_orders_batch(request: Request):
+    ndjson = request.headers.get("content-type", "").split(";")[0].strip() == "application/x-ndjson"
+    try:
+        items = parse_batch(await request.body(), ndjson)
+    except ValueError as e:
+        return _error(400, str(e))
+    if not items:
+        return _error(400, "nenhum pedido enviado")
+    if len(items) > ORDER_BATCH_MAX:
+        return _error(413, f"máximo de {ORDER_BATCH_MAX} pedidos por lote")
+    rejected = await _admit()
+    if rejected is not None:
+        return rejected
+
+    results, orders, outbox_rows = build_batch(items, tracing.inject({}))
+    if orders:
+        async with AsyncSessionLocal() as s:
+            await s.execute(insert(Order), orders)
+            await s.execute(insert(OutboxEvent), outbox_rows)
+            await s.commit()
+        outbox.notify()
+        for r in results:
+            if r["status"] == 201:
+                order_cache.put(r["order"])
+
+    body = {"created": len(orders), "failed": len(items) - len(orders), "results": results}
+    return JSONResponse(body, status_code=batch_status(len(orders), len(items)))
+
+async def list_orders(request: Request):
+    args = request.query_params
+    default_from = default_created_from(args, partitioning.orders_partitioned())
+    try:
+        stmt = orders_query(args, default_from)
+    except ValueError as e:
+        return _error(400, str(e))
+
+    if args.get("format") == "ndjson":
+        limit = int_arg(args, "limit")
+        if limit:
+            stmt = stmt.limit(limit)
+
+        async def _stream():
+            async with AsyncSessionLocal() as s:
+                rows = await s.stream_scalars(stmt.execution_options(yield_per=EXPORT_YIELD_PER))
+                async for o in rows:
+                    yield json.dumps(o.to_dict()) + "\n"
+
+        return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+    limit = list_limit(args)
+    async with AsyncSessionLocal() as s:
+        rows = (await s.execute(stmt.limit(limit + 1))).scalars().all()
+
+    page, cursor = list_page(rows, limit)
+    headers = {}
+    if cursor:
+        headers["X-Next-Cursor"] = cursor
+    if default_from:
+        # janela aplicada sem o cliente pedir; para ir mais longe, created_from
+        headers["X-Created-From"] = default_from.isoformat() + "Z"
+    return JSONResponse(page, headers=headers or None)
+
+async def _load_order(order_id: str):
+    async with AsyncSessionLocal() as s:
+        obj = (await s.execute(select(Order).where(*order_key(order_id)))).scalar()
+        return obj.to_dict() if obj else None
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match: "*" ou lista separada por vírgulas; a comparação é fraca,
+    # então W/"x" também casa com "x"
+    tags = [t.strip() for t in header.split(",") if t.strip()]
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+async def get_order(request: Request):
+    order_id = request.path_params["order_id"]
+    try:
+        wait = min(float(request.query_params.get("wait", 0)), ORDER_WAIT_MAX)
+    except ValueError:
+        wait = 0
+    if wait <= 0:
+        entry = await order_cache.aget(order_id, _load_order)
+    else:
+        waiter = notify.hub.subscribe(order_id, notify.AsyncWaiter())
+        try:
+            entry = await order_cache.aget(order_id, _load_order)
+            if entry and entry[0]["status"] == "PENDING" and await waiter.wait(wait):
+                entry = await order_cache.aget(order_id, _load_order)
+        finally:
+            notify.hub.unsubscribe(order_id, waiter)
+    if not entry:
+        return _error(404, "order not found")
+
+    data, etag = entry
+    quoted = f'"{etag}"'
+    if _etag_matches(request.headers.get("if-none-match", ""), quoted):
+        return Response(status_code=304, headers={"ETag": quoted})
+    return JSONResponse(data, headers={"ETag": quoted})
+
+async def _on_payment_events(messages: list[dict]):
+    paid, cancelled = payment_transitions(messages)
+    if not paid and not cancelled:
+        return
+
+    async with AsyncSessionLocal() as s:
+        for stmt in status_updates(paid, cancelled):
+            await s.execute(stmt)
+        if PG_NOTIFY:
+            for params in notify.pg_notify_params(paid | cancelled):
+                await s.execute(notify.NOTIFY_SQL, params)
+        await s.commit()
+    # o cache local é limpo pelo listener do hub; aqui só a camada compartilhada
+    order_cache.invalidate(paid | cancelled, local=False)
+    notify.hub.notify(paid | cancelled)
+
+@asynccontextmanager
+async def lifespan(app):
+    # DDL no gunicorn.conf.py (master) ou no worker.py; aqui só o que é do processo
+    if PG_NOTIFY:
+        notify.start_listener(engine)
+    # consulta síncrona ao catálogo: feita aqui, fora das requisições
+    partitioning.orders_partitioned()
+    admission.controller.start()
+    consumer = stop_relay = None
+    if WEB_CONSUMERS:
+        consumer = start_consumer(
+            queue="orders.payments",
+            binding_keys=["payment.succeeded", "payment.failed"],
+            batch_handler=_on_payment_events,
+        )
+        stop_relay = outbox.start_relay_async(AsyncSessionLocal, publisher.publish_many)
+        partitioning.start_maintenance()
+    yield
+    if stop_relay is not None:
+        await stop_relay()
+    if consumer is not None:
+        await consumer.aclose()
+    await publisher.close()
+    await async_engine.dispose()
+
+async def traces(request: Request):
+    limit = int(request.query_params.get("limit", 1000))
+    return JSONResponse(tracing.recent_spans(request.query_params.get("trace_id"), limit))
+
+app = instrument_asgi(tracing.instrument_asgi(Starlette(
+    routes=[
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/traces", traces, methods=["GET"]),
+        Route("/consumers/stats", consumers_stats, methods=["GET"]),
+        Route("/db/stats", db_stats, methods=["GET"]),
+        Route("/admission/stats", admission_stats, methods=["GET"]),
+        Route("/outbox/stats", outbox_stats, methods=["GET"]),
+        Route("/cache/stats", cache_stats, methods=["GET"]),
+        Route("/orders", create_order, methods=["POST"]),
+        Route("/orders", list_orders, methods=["GET"]),
+        Route("/orders:batch", create_orders_batch, methods=["POST"]),
+        Route("/orders/{order_id}", get_order, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)))
@@ -0,0 +1,224 @@
+import os, json, time, hashlib, logging, threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+ORDER_CACHE_SIZE = int(os.getenv("ORDER_CACHE_SIZE", "10000"))
+ORDER_CACHE_TTL = float(os.getenv("ORDER_CACHE_TTL", "30"))
+# opcional: camada compartilhada entre processos/instâncias (redis://...);
+# "memory://" usa o MemoryBackend, o stand-in local de mesma interface
+ORDER_CACHE_SHARED_URL = os.getenv("ORDER_CACHE_SHARED_URL", "")
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+class MemoryBackend:
+    # Mesma interface do RedisBackend, para testes e benchmarks sem Redis.
+    def __init__(self):
+        self._data: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+        if item is None or item[1] < time.time():
+            return None
+        return item[0]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+
+    def delete(self, keys: list[str]):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+class RedisBackend:
+    def __init__(self, url: str):
+        import redis  # dependência opcional, só com ORDER_CACHE_SHARED_URL=redis://
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._client.set(key, value, px=int(ttl * 1000))
+
+    def delete(self, keys: list[str]):
+        if keys:
+            self._client.delete(*keys)
+
+def shared_backend(url: str = ORDER_CACHE_SHARED_URL):
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    try:
+        return RedisBackend(url)
+    except ImportError:
+        logger.warning("ORDER_CACHE_SHARED_URL definido mas o pacote redis não está instalado; usando só o cache local")
+        return None
+
+def etag_for(data: dict) -> str:
+    raw = json.dumps(data, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=12).hexdigest()
+
+class OrderCache:
+    # Read-through de Order.to_dict(): LRU/TTL local -> camada compartilhada
+    # (opcional) -> loader (banco). Entradas guardam (dados, etag).
+    def __init__(self, size: int = ORDER_CACHE_SIZE, ttl: float = ORDER_CACHE_TTL, shared=None):
+        self.local = LRUCache(size, ttl)
+        self.ttl = ttl
+        self.shared = shared
+        self.shared_hits = 0
+        self.invalidations = 0
+        self.stale_loads = 0
+        # geração de invalidação por pedido, só enquanto há loader em curso:
+        # um invalidate no meio do loader impede que o valor antigo volte ao cache
+        self._lock = threading.Lock()
+        self._loading: dict = {}
+        self._generations: dict = {}
+
+    def _key(self, order_id: str) -> str:
+        return f"order:{order_id}"
+
+    def _cached(self, order_id: str):
+        entry = self.local.get(order_id)
+        if entry is not None:
+            return entry
+        if self.shared is not None:
+            try:
+                raw = self.shared.get(self._key(order_id))
+            except Exception as e:
+                logger.warning("cache compartilhado indisponível: %s", e)
+                raw = None
+            if raw is not None:
+                data = json.loads(raw)
+                entry = (data, etag_for(data))
+                self.local.set(order_id, entry)
+                self.shared_hits += 1
+                return entry
+        return None
+
+    def _begin_load(self, order_id: str) -> int:
+        with self._lock:
+            self._loading[order_id] = self._loading.get(order_id, 0) + 1
+            return self._generations.get(order_id, 0)
+
+    def _end_load(self, order_id: str, generation: int) -> bool:
+        # True se ninguém invalidou o pedido enquanto o loader rodava
+        with self._lock:
+            fresh = self._generations.get(order_id, 0) == generation
+            self._loading[order_id] -= 1
+            if not self._loading[order_id]:
+                del self._loading[order_id]
+                self._generations.pop(order_id, None)
+            return fresh
+
+    def _loaded(self, data, fresh: bool):
+        if data is None:
+            return None
+        if not fresh:
+            # devolve o que leu, mas não grava por cima da invalidação
+            self.stale_loads += 1
+            return data, etag_for(data)
+        return self.put(data)
+
+    def get(self, order_id: str, loader):
+        entry = self._cached(order_id)
+        if entry is not None:
+            return entry
+        generation = self._begin_load(order_id)
+        try:
+            data = loader(order_id)
+        finally:
+            fresh = self._end_load(order_id, generation)
+        return self._loaded(data, fresh)
+
+    async def aget(self, order_id: str, loader):
+        # igual ao get(), com loader assíncrono (modo asyncio)
+        entry = self._cached(order_id)
+        if entry is not None:
+            return entry
+        generation = self._begin_load(order_id)
+        try:
+            data = await loader(order_id)
+        finally:
+            fresh = self._end_load(order_id, generation)
+        return self._loaded(data, fresh)
+
+    def put(self, data: dict):
+        entry = (data, etag_for(data))
+        self.local.set(data["id"], entry)
+        if self.shared is not None:
+            try:
+                self.shared.set(self._key(data["id"]), json.dumps(data).encode("utf-8"), self.ttl)
+            except Exception as e:
+                logger.warning("cache compartilhado indisponível: %s", e)
+        return entry
+
+    def invalidate(self, order_ids, shared: bool = True, local: bool = True):
+        # local=False: só a camada compartilhada (o hub limpa o cache local)
+        order_ids = list(order_ids)
+        if local:
+            with self._lock:
+                for oid in order_ids:
+                    if oid in self._loading:
+                        self._generations[oid] = self._generations.get(oid, 0) + 1
+            for oid in order_ids:
+                if self.local.pop(oid):
+                    self.invalidations += 1
+        if shared and self.shared is not None:
+            try:
+                self.shared.delete([self._key(oid) for oid in order_ids])
+            except Exception as e:
+                logger.warning("cache compartilhado indisponível: %s", e)
+
+    def stats(self) -> dict:
+        st = self.local.stats()
+        lookups = st["hits"] + st["misses"]
+        st["hit_ratio"] = st["hits"] / lookups if lookups else 0.0
+        st["shared_hits"] = self.shared_hits
+        st["invalidations"] = self.invalidations
+        st["stale_loads"] = self.stale_loads
+        return st
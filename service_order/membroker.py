@@ -0,0 +1,449 @@
+import hashlib, heapq, itertools, threading, time
+from collections import deque
+from queue import Empty, SimpleQueue
+import pika
+from pika.exceptions import ChannelClosedByBroker, ChannelWrongStateError, ConnectionWrongStateError, NackError
+
+# Broker em memória para RABBITMQ_URL=memory:// (ou memory://<nome>): o
+# subconjunto da pika.BlockingConnection usado pelo events.py, com exchanges
+# topic/direct/default, prefetch, ack/nack (multiple e requeue), TTL com
+# dead-letter (filas de retry), x-max-length/x-overflow, x-consistent-hash
+# (rendezvous sobre as filas ligadas), bindings exchange -> exchange, filas
+# exclusivas, x-single-active-consumer e entrega na thread de quem chama
+# start_consuming/process_data_events. Serve para rodar order -> payment ->
+# order num processo só (tools/bench_pipeline.py), sem RabbitMQ.
+
+_brokers: dict[str, "Broker"] = {}
+_brokers_lock = threading.Lock()
+
+
+def connect(url: str = "memory://") -> "Connection":
+    name = url[len("memory://"):].strip("/")
+    with _brokers_lock:
+        broker = _brokers.setdefault(name, Broker())
+    return Connection(broker)
+
+
+def get_broker(url: str = "memory://") -> "Broker":
+    with _brokers_lock:
+        return _brokers.setdefault(url[len("memory://"):].strip("/"), Broker())
+
+
+def topic_matches(pattern: str, key: str) -> bool:
+    # "*" casa uma palavra, "#" zero ou mais
+    def match(p: list, k: list) -> bool:
+        if not p:
+            return not k
+        if p[0] == "#":
+            return any(match(p[1:], k[i:]) for i in range(len(k) + 1))
+        if not k:
+            return False
+        return (p[0] == "*" or p[0] == k[0]) and match(p[1:], k[1:])
+    return match(pattern.split("."), key.split("."))
+
+
+class _Message:
+    __slots__ = ("exchange", "routing_key", "properties", "body", "redelivered")
+
+    def __init__(self, exchange, routing_key, properties, body, redelivered=False):
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.properties = properties or pika.BasicProperties()
+        self.body = body
+        self.redelivered = redelivered
+
+
+class _Queue:
+    def __init__(self, name: str, arguments: dict):
+        self.name = name
+        self.arguments = arguments
+        self.messages: deque[_Message] = deque()
+        self.consumers: list["Channel"] = []
+        self._next = 0
+
+
+class Broker:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.exchanges: dict[str, str] = {"": "direct"}
+        self.exchange_arguments: dict[str, dict] = {}
+        self.bindings: dict[str, list[tuple[str, str]]] = {}
+        self.exchange_bindings: dict[str, list[tuple[str, str]]] = {}
+        self.queues: dict[str, _Queue] = {}
+        self._expiry: list = []
+        self._expiry_seq = itertools.count()
+        self._expiry_cond = threading.Condition(self.lock)
+        self._expiry_thread = None
+        self._queue_seq = itertools.count(1)
+
+    # roteamento
+    def route(self, exchange: str, routing_key: str, properties=None) -> list[_Queue]:
+        if exchange == "":
+            q = self.queues.get(routing_key)
+            return [q] if q else []
+        kind = self.exchanges[exchange]
+        if kind == "x-consistent-hash":
+            names = [queue for queue, _ in self.bindings.get(exchange, [])]
+            header = self.exchange_arguments.get(exchange, {}).get("hash-header")
+            key = str(((properties and properties.headers) or {}).get(header, "")) if header else routing_key
+            if not names:
+                return []
+            return [self.queues[max(names, key=lambda n: hashlib.md5(f"{n}/{key}".encode()).digest())]]
+        matches = (lambda k: topic_matches(k, routing_key)) if kind == "topic" else (lambda k: k == routing_key)
+        names = {queue for queue, key in self.bindings.get(exchange, []) if matches(key)}
+        out = [self.queues[n] for n in sorted(names)]
+        for dest, key in self.exchange_bindings.get(exchange, []):
+            if matches(key):
+                out += [q for q in self.route(dest, routing_key, properties) if q not in out]
+        return out
+
+    def publish(self, exchange: str, routing_key: str, properties, body: bytes) -> bool:
+        # False se alguma fila recusou (x-overflow=reject-publish cheia)
+        with self.lock:
+            accepted = True
+            for q in self.route(exchange, routing_key, properties):
+                accepted &= self._enqueue(q, _Message(exchange, routing_key, properties, body))
+            return accepted
+
+    def _enqueue(self, q: _Queue, msg: _Message, front: bool = False) -> bool:
+        max_length = q.arguments.get("x-max-length")
+        if max_length is not None and not front and len(q.messages) >= max_length:
+            if q.arguments.get("x-overflow", "drop-head") != "drop-head":
+                if q.arguments.get("x-overflow") == "reject-publish-dlx":
+                    self.dead_letter(q, msg)
+                return False
+            self.dead_letter(q, q.messages.popleft())
+        if front:
+            q.messages.appendleft(msg)
+        else:
+            q.messages.append(msg)
+        ttl = q.arguments.get("x-message-ttl")
+        if ttl is not None:
+            heapq.heappush(self._expiry, (time.monotonic() + ttl / 1000, next(self._expiry_seq), q, msg))
+            if self._expiry_thread is None:
+                self._expiry_thread = threading.Thread(target=self._expire_loop, name="membroker-ttl", daemon=True)
+                self._expiry_thread.start()
+            self._expiry_cond.notify()
+        self.dispatch(q)
+        return True
+
+    def dead_letter(self, q: _Queue, msg: _Message):
+        dlx = q.arguments.get("x-dead-letter-exchange")
+        if dlx is None:
+            return
+        key = q.arguments.get("x-dead-letter-routing-key", msg.routing_key)
+        for target in self.route(dlx, key, msg.properties):
+            self._enqueue(target, _Message(dlx, key, msg.properties, msg.body))
+
+    def _expire_loop(self):
+        with self.lock:
+            while True:
+                if not self._expiry:
+                    self._expiry_cond.wait()
+                    continue
+                due, _, q, msg = self._expiry[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._expiry_cond.wait(wait)
+                    continue
+                heapq.heappop(self._expiry)
+                try:
+                    q.messages.remove(msg)
+                except ValueError:
+                    continue  # já entregue
+                self.dead_letter(q, msg)
+
+    def delete_queue(self, name: str):
+        self.queues.pop(name, None)
+        for exchange, bindings in self.bindings.items():
+            self.bindings[exchange] = [b for b in bindings if b[0] != name]
+
+    # entrega
+    def dispatch(self, q: _Queue):
+        # single-active-consumer: só o primeiro inscrito recebe; os outros
+        # assumem na ordem quando ele sai
+        consumers = q.consumers[:1] if q.arguments.get("x-single-active-consumer") else q.consumers
+        while q.messages and consumers:
+            for _ in range(len(consumers)):
+                ch = consumers[q._next % len(consumers)]
+                q._next += 1
+                if ch.has_capacity():
+                    break
+            else:
+                return
+            ch.deliver(q, q.messages.popleft())
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {name: {"messages": len(q.messages), "consumers": len(q.consumers),
+                           "unacked": sum(ch.unacked_in(q) for ch in q.consumers)}
+                    for name, q in self.queues.items()}
+
+
+class Connection:
+    def __init__(self, broker: Broker):
+        self.broker = broker
+        self.is_open = True
+        self._channels: list[Channel] = []
+        self._exclusive: list[str] = []
+        self._inbox: SimpleQueue = SimpleQueue()
+        self._timers: list = []
+        self._timer_seq = itertools.count()
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.is_open
+
+    def channel(self) -> "Channel":
+        if not self.is_open:
+            raise ConnectionWrongStateError("conexão fechada")
+        ch = Channel(self, len(self._channels) + 1)
+        self._channels.append(ch)
+        return ch
+
+    def add_callback_threadsafe(self, callback):
+        if not self.is_open:
+            raise ConnectionWrongStateError("conexão fechada")
+        self._inbox.put(callback)
+
+    def call_later(self, delay: float, callback):
+        handle = [time.monotonic() + delay, next(self._timer_seq), callback]
+        heapq.heappush(self._timers, handle)
+        return handle
+
+    def remove_timeout(self, handle):
+        handle[2] = None
+
+    def process_data_events(self, time_limit: float = 0):
+        self._run_once(1.0 if time_limit is None else time_limit)
+
+    def _run_once(self, timeout: float):
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, cb = heapq.heappop(self._timers)
+            if cb is not None:
+                cb()
+        if self._timers:
+            timeout = min(timeout, max(0, self._timers[0][0] - now))
+        try:
+            cb = self._inbox.get(timeout=timeout) if timeout > 0 else self._inbox.get_nowait()
+        except Empty:
+            return
+        cb()
+
+    def close(self):
+        if not self.is_open:
+            return
+        self.is_open = False
+        for ch in self._channels:
+            ch.close()
+        with self.broker.lock:
+            for name in self._exclusive:
+                self.broker.delete_queue(name)
+
+
+class Channel:
+    def __init__(self, connection: Connection, number: int):
+        self.connection = connection
+        self.broker = connection.broker
+        self.channel_number = number
+        self.is_open = True
+        self.prefetch = 0
+        self.confirming = False
+        self._consumers: dict[str, tuple] = {}
+        self._unacked: dict[int, tuple[_Queue, _Message]] = {}
+        self._tags = itertools.count(1)
+        self._consuming = False
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.is_open
+
+    def _check(self):
+        if not self.is_open:
+            raise ChannelWrongStateError("canal fechado")
+
+    def _fail(self, code: int, text: str):
+        # como no RabbitMQ, um erro de protocolo fecha o canal
+        self.close()
+        raise ChannelClosedByBroker(code, text)
+
+    # topologia
+    def exchange_declare(self, exchange: str, exchange_type: str = "direct", durable: bool = False,
+                         passive: bool = False, arguments: dict = None, **_):
+        self._check()
+        with self.broker.lock:
+            kind = self.broker.exchanges.get(exchange)
+            if kind is None and passive:
+                self._fail(404, f"NOT_FOUND - no exchange '{exchange}'")
+            if kind is not None and kind != str(exchange_type) and not passive:
+                self._fail(406, f"PRECONDITION_FAILED - inequivalent arg 'type' for exchange '{exchange}'")
+            self.broker.exchanges.setdefault(exchange, str(exchange_type))
+            self.broker.exchange_arguments.setdefault(exchange, dict(arguments or {}))
+
+    def exchange_bind(self, destination: str, source: str, routing_key: str = "", **_):
+        self._check()
+        with self.broker.lock:
+            for name in (destination, source):
+                if name not in self.broker.exchanges:
+                    self._fail(404, f"NOT_FOUND - no exchange '{name}'")
+            binding = (destination, routing_key)
+            if binding not in self.broker.exchange_bindings.setdefault(source, []):
+                self.broker.exchange_bindings[source].append(binding)
+
+    def queue_declare(self, queue: str, durable: bool = False, arguments: dict = None, passive: bool = False,
+                      exclusive: bool = False, **_):
+        self._check()
+        with self.broker.lock:
+            if not queue and not passive:
+                queue = f"amq.gen-{next(self.broker._queue_seq)}"
+            if exclusive and queue not in self.broker.queues:
+                self.connection._exclusive.append(queue)
+            q = self.broker.queues.get(queue)
+            if q is None:
+                if passive:
+                    self._fail(404, f"NOT_FOUND - no queue '{queue}'")
+                q = self.broker.queues[queue] = _Queue(queue, dict(arguments or {}))
+            elif not passive and dict(arguments or {}) != q.arguments:
+                self._fail(406, f"PRECONDITION_FAILED - inequivalent arguments for queue '{queue}'")
+            return pika.frame.Method(self.channel_number, pika.spec.Queue.DeclareOk(
+                queue, len(q.messages), len(q.consumers)))
+
+    def queue_bind(self, queue: str, exchange: str, routing_key: str = None, **_):
+        self._check()
+        with self.broker.lock:
+            if exchange not in self.broker.exchanges:
+                self._fail(404, f"NOT_FOUND - no exchange '{exchange}'")
+            if queue not in self.broker.queues:
+                self._fail(404, f"NOT_FOUND - no queue '{queue}'")
+            binding = (queue, routing_key if routing_key is not None else queue)
+            if binding not in self.broker.bindings.setdefault(exchange, []):
+                self.broker.bindings[exchange].append(binding)
+
+    def queue_purge(self, queue: str):
+        self._check()
+        with self.broker.lock:
+            q = self.broker.queues[queue]
+            count = len(q.messages)
+            q.messages.clear()
+            return pika.frame.Method(self.channel_number, pika.spec.Queue.PurgeOk(count))
+
+    def confirm_delivery(self):
+        # o publish já é síncrono: quando volta, a mensagem está na fila
+        self._check()
+        self.confirming = True
+
+    def basic_qos(self, prefetch_count: int = 0, **_):
+        self._check()
+        self.prefetch = prefetch_count
+
+    # publish
+    def basic_publish(self, exchange: str, routing_key: str, body: bytes, properties=None, mandatory: bool = False):
+        self._check()
+        with self.broker.lock:
+            if exchange not in self.broker.exchanges:
+                self._fail(404, f"NOT_FOUND - no exchange '{exchange}'")
+            accepted = self.broker.publish(exchange, routing_key, properties, body)
+        if not accepted and self.confirming:
+            raise NackError([])
+
+    # consumo
+    def basic_consume(self, queue: str, on_message_callback, auto_ack: bool = False, consumer_tag: str = None, **_):
+        self._check()
+        tag = consumer_tag or f"ctag{self.channel_number}.{len(self._consumers) + 1}"
+        with self.broker.lock:
+            q = self.broker.queues.get(queue)
+            if q is None:
+                self._fail(404, f"NOT_FOUND - no queue '{queue}'")
+            self._consumers[tag] = (q, on_message_callback, auto_ack)
+            q.consumers.append(self)
+            self.broker.dispatch(q)
+        return tag
+
+    def basic_get(self, queue: str, auto_ack: bool = False):
+        self._check()
+        with self.broker.lock:
+            q = self.broker.queues[queue]
+            if not q.messages:
+                return None, None, None
+            msg = q.messages.popleft()
+            tag = next(self._tags)
+            if not auto_ack:
+                self._unacked[tag] = (q, msg)
+            method = pika.spec.Basic.GetOk(tag, msg.redelivered, msg.exchange, msg.routing_key, len(q.messages))
+            return method, msg.properties, msg.body
+
+    def has_capacity(self) -> bool:
+        return self.is_open and (self.prefetch <= 0 or len(self._unacked) < self.prefetch)
+
+    def unacked_in(self, q: _Queue) -> int:
+        return sum(1 for uq, _ in self._unacked.values() if uq is q)
+
+    def deliver(self, q: _Queue, msg: _Message):
+        # chamado com o lock do broker; o callback roda na thread do consumer
+        tag, callback, auto_ack = next((t, cb, a) for t, (cq, cb, a) in self._consumers.items() if cq is q)
+        delivery_tag = next(self._tags)
+        if not auto_ack:
+            self._unacked[delivery_tag] = (q, msg)
+        method = pika.spec.Basic.Deliver(tag, delivery_tag, msg.redelivered, msg.exchange, msg.routing_key)
+        # consumer cancelado antes da entrega: a mensagem fica em _unacked e volta no close
+        self.connection._inbox.put(lambda: tag in self._consumers and self.is_open and
+                                   callback(self, method, msg.properties, msg.body))
+
+    def _settle(self, delivery_tag: int, multiple: bool) -> list[tuple[_Queue, _Message]]:
+        if multiple:
+            tags = sorted(t for t in self._unacked if t <= delivery_tag or delivery_tag == 0)
+        elif delivery_tag in self._unacked:
+            tags = [delivery_tag]
+        else:
+            self._fail(406, f"PRECONDITION_FAILED - unknown delivery tag {delivery_tag}")
+        return [self._unacked.pop(t) for t in tags]
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False):
+        self._check()
+        with self.broker.lock:
+            settled = self._settle(delivery_tag, multiple)
+            for q in {id(q): q for q, _ in settled}.values():
+                self.broker.dispatch(q)
+
+    def basic_nack(self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True):
+        self._check()
+        with self.broker.lock:
+            settled = self._settle(delivery_tag, multiple)
+            for q, msg in reversed(settled):
+                if requeue:
+                    msg.redelivered = True
+                    self.broker._enqueue(q, msg, front=True)
+                else:
+                    self.broker.dead_letter(q, msg)
+
+    def basic_reject(self, delivery_tag: int = 0, requeue: bool = True):
+        self.basic_nack(delivery_tag, requeue=requeue)
+
+    def start_consuming(self):
+        self._consuming = True
+        while self._consuming and self.is_open:
+            self.connection._run_once(0.1)
+
+    def stop_consuming(self):
+        self._consuming = False
+        with self.broker.lock:
+            queues = [q for q, _, _ in self._consumers.values()]
+            for q in queues:
+                if self in q.consumers:
+                    q.consumers.remove(self)
+            self._consumers.clear()
+            for q in queues:
+                self.broker.dispatch(q)
+
+    def close(self):
+        if not self.is_open:
+            return
+        self.stop_consuming()
+        self.is_open = False
+        # não confirmadas voltam para a frente da fila, na ordem original
+        with self.broker.lock:
+            pending, self._unacked = sorted(self._unacked.items()), {}
+            for _, (q, msg) in reversed(pending):
+                msg.redelivered = True
+                self.broker._enqueue(q, msg, front=True)
@@ -0,0 +1,243 @@
+import time
+import threading
+from bisect import bisect_left
+
+# Métricas no formato texto do Prometheus, sem dependências externas. O custo
+# por observação é uma busca binária nos buckets e um lock sem contenção.
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics: list = []
+_collectors: list = []
+
+def _fmt_labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_fmt_labels(self.labelnames, values)} {child.value}"]
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+class _Timer:
+    __slots__ = ("child", "t0")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.t0)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines, acc = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            acc += n
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, values, le)} {acc}")
+        labels = _fmt_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+def register_collector(fn):
+    # fn() -> [(nome, tipo, ajuda, [(labels: dict, valor), ...]), ...]
+    # chamada só no scrape; serve para expor os stats() que já existem.
+    _collectors.append(fn)
+    return fn
+
+def render() -> str:
+    lines = []
+    for m in list(_metrics):
+        lines.extend(m.render())
+    for fn in list(_collectors):
+        try:
+            families = fn()
+        except Exception:
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_fmt_labels(labels.keys(), labels.values())} {float(value or 0)}")
+    return "\n".join(lines) + "\n"
+
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Latência HTTP por rota", ("method", "route", "status"))
+PUBLISH_SECONDS = Histogram("events_publish_duration_seconds", "Latência de publish_event (inclui confirm)", ("routing_key",))
+PUBLISH_RETRIES = Counter("events_publish_retries_total", "Tentativas de publish que falharam e foram repetidas", ("routing_key",))
+CONSUMER_HANDLER_SECONDS = Histogram("consumer_handler_duration_seconds", "Duração do handler (mensagem ou lote)", ("queue",))
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Tempo de execução de statements SQL")
+DB_POOL_WAIT_SECONDS = Histogram("db_pool_checkout_wait_seconds", "Espera por uma conexão do pool")
+DB_POOL_PRE_PINGS = Counter("db_pool_pre_pings_total", "Pre-pings (SELECT 1) feitos no checkout de conexões")
+
+def instrument_flask(app):
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_t0 = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        t0 = g.pop("_metrics_t0", None)
+        if t0 is not None:
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            HTTP_REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(time.perf_counter() - t0)
+        return response
+
+    @app.get("/metrics")
+    def metrics():
+        return app.response_class(render(), mimetype="text/plain; version=0.0.4")
+
+def _asgi_route(app, scope) -> str:
+    from starlette.routing import Match
+    for route in app.routes:
+        if route.matches(scope)[0] == Match.FULL:
+            return route.path
+    return "<unmatched>"
+
+def instrument_asgi(app):
+    # equivalente do instrument_flask para o modo asyncio (Starlette); a rota
+    # /metrics é declarada pelo próprio asgi.py
+    async def _app(scope, receive, send):
+        if scope["type"] != "http":
+            return await app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await app(scope, receive, _send)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(scope["method"], _asgi_route(app, scope), status[0]).observe(time.perf_counter() - t0)
+
+    _app.routes = app.routes
+    return _app
+
+def instrument_engine(engine):
+    from sqlalchemy import event
+
+    # início de cada statement indexado pelo contexto de execução dele, não
+    # numa pilha: um erro só descarta o timer do statement que falhou
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_t0", {})[id(context)] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info.get("_metrics_t0", {}).pop(id(context), None)
+        if t0 is not None:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - t0)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # statement que falhou não passa pelo after_cursor_execute
+        conn = context.connection
+        if conn is not None:
+            conn.info.get("_metrics_t0", {}).pop(id(context.execution_context), None)
+
+    # o pool não tem evento de "início de espera": mede em volta do _do_get
+    # trocando a classe do pool, o que sobrevive ao recreate() do dispose()
+    pool_cls = type(engine.pool)
+    if not getattr(pool_cls, "_metrics_timed", False):
+        def _do_get(self):
+            t0 = time.perf_counter()
+            try:
+                return super(timed_cls, self)._do_get()
+            finally:
+                DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - t0)
+
+        timed_cls = type(pool_cls.__name__, (pool_cls,), {"_do_get": _do_get, "_metrics_timed": True})
+        engine.pool.__class__ = timed_cls
@@ -0,0 +1,137 @@
+import os
+import time
+import asyncio
+import select
+import logging
+import threading
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# "auto" usa LISTEN/NOTIFY quando o banco é Postgres (vários workers do
+# gunicorn: o consumer que atualizou o pedido pode não ser o processo que
+# está segurando o long-poll) e só o hub local nos demais casos.
+ORDER_STATUS_NOTIFY = os.getenv("ORDER_STATUS_NOTIFY", "auto")
+CHANNEL = "order_status"
+_PAYLOAD_LIMIT = 7900  # NOTIFY aceita até 8000 bytes de payload
+
+class AsyncWaiter:
+    # mesma interface de threading.Event para o hub; asyncio.Event não é
+    # thread-safe, então o set() é agendado no loop de quem está esperando
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+class StatusHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: dict[str, list[threading.Event]] = {}
+        self._listeners: list = []
+
+    def add_listener(self, fn):
+        # chamados antes de acordar quem está em long-poll (ex.: invalidar cache)
+        self._listeners.append(fn)
+
+    def subscribe(self, order_id: str, waiter=None) -> threading.Event:
+        ev = waiter or threading.Event()
+        with self._lock:
+            self._waiters.setdefault(order_id, []).append(ev)
+        return ev
+
+    def unsubscribe(self, order_id: str, ev: threading.Event):
+        with self._lock:
+            waiters = self._waiters.get(order_id)
+            if waiters and ev in waiters:
+                waiters.remove(ev)
+                if not waiters:
+                    del self._waiters[order_id]
+
+    def notify(self, order_ids):
+        order_ids = list(order_ids)
+        for fn in self._listeners:
+            try:
+                fn(order_ids)
+            except Exception as e:
+                logger.warning("listener de status falhou: %s", e)
+        with self._lock:
+            events = [ev for oid in order_ids for ev in self._waiters.get(oid, ())]
+        for ev in events:
+            ev.set()
+
+    def waiting(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._waiters.values())
+
+hub = StatusHub()
+
+def uses_pg(engine) -> bool:
+    if ORDER_STATUS_NOTIFY == "auto":
+        return engine.dialect.name == "postgresql"
+    return ORDER_STATUS_NOTIFY == "pg"
+
+NOTIFY_SQL = text("SELECT pg_notify(:ch, :payload)")
+
+def pg_notify_params(order_ids) -> list[dict]:
+    params, chunk, size = [], [], 0
+    for oid in order_ids:
+        if size + len(oid) + 1 > _PAYLOAD_LIMIT:
+            params.append({"ch": CHANNEL, "payload": ",".join(chunk)})
+            chunk, size = [], 0
+        chunk.append(oid)
+        size += len(oid) + 1
+    if chunk:
+        params.append({"ch": CHANNEL, "payload": ",".join(chunk)})
+    return params
+
+def pg_notify(session, order_ids):
+    # dentro da transação: o Postgres só entrega o NOTIFY no commit
+    for params in pg_notify_params(order_ids):
+        session.execute(NOTIFY_SQL, params)
+
+def _listen(conn, driver: str):
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {CHANNEL}")
+    if driver == "psycopg":
+        # psycopg 3: notifies() é um gerador que entrega cada NOTIFY assim
+        # que chega e termina depois do timeout
+        while True:
+            for n in conn.notifies(timeout=5):
+                hub.notify(n.payload.split(","))
+    # psycopg2: espera o socket e lê a lista conn.notifies depois do poll()
+    while True:
+        if select.select([conn], [], [], 5) == ([], [], []):
+            continue
+        conn.poll()
+        while conn.notifies:
+            hub.notify(conn.notifies.pop(0).payload.split(","))
+
+def start_listener(engine):
+    def _run():
+        while True:
+            conn = None
+            try:
+                raw = engine.raw_connection()
+                raw.detach()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                _listen(conn, engine.dialect.driver)
+            except Exception as e:
+                logger.warning("listener de %s caiu: %s; reconectando…", CHANNEL, e)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                time.sleep(2)
+
+    threading.Thread(target=_run, name="order-status-listener", daemon=True).start()
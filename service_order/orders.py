@@ -0,0 +1,222 @@
+import os
+import json
+import uuid
+import base64
+import datetime as dt
+from sqlalchemy import select, tuple_, update
+from models import Order
+
+# Regras de pedido usadas pelo app Flask (app.py) e pelo modo asyncio (asgi.py).
+
+LIST_DEFAULT_LIMIT = 100
+LIST_MAX_LIMIT = 1000
+# sem created_from, a listagem paginada de GET /orders na tabela particionada
+# só olha os últimos N dias (as partições recentes); 0 desliga a janela
+ORDER_LIST_DEFAULT_DAYS = int(os.getenv("ORDER_LIST_DEFAULT_DAYS", "30"))
+ORDER_BATCH_MAX = int(os.getenv("ORDER_BATCH_MAX", "1000"))
+ORDER_COLUMNS = ("id", "customer_name", "item", "amount_cents", "status", "created_at")
+
+EPOCH = dt.datetime(1970, 1, 1)
+ONE_MS = dt.timedelta(milliseconds=1)
+
+def new_order_id(created_at: dt.datetime) -> str:
+    # UUID v7: os 48 bits iniciais são o ms de created_at. Quem só tem o id
+    # (GET /orders/<id>, eventos de pagamento) sabe em qual partição de tempo
+    # procurar, e ids crescentes mantêm as inserções no fim do índice
+    ms = (created_at - EPOCH) // ONE_MS
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (ms << 80) | (0x7 << 76) | (((rand >> 62) & 0xFFF) << 64) | (0b10 << 62) | (rand & ((1 << 62) - 1))
+    return str(uuid.UUID(int=value))
+
+def created_at_from_id(order_id: str):
+    # None para ids antigos (uuid4) ou inválidos: aí a busca não poda
+    try:
+        u = uuid.UUID(order_id)
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if u.version != 7:
+        return None
+    return EPOCH + (u.int >> 80) * ONE_MS
+
+def order_key(order_ids) -> list:
+    # filtros por id que deixam o Postgres podar as partições de orders pelo
+    # created_at embutido nos ids v7
+    if isinstance(order_ids, str):
+        order_ids = [order_ids]
+    order_ids = sorted(order_ids)
+    clauses = [Order.id == order_ids[0] if len(order_ids) == 1 else Order.id.in_(order_ids)]
+    times = [created_at_from_id(i) for i in order_ids]
+    if times and None not in times:
+        clauses += [Order.created_at >= min(times), Order.created_at < max(times) + ONE_MS]
+    return clauses
+
+def build_order(data) -> tuple[Order, dict]:
+    if not isinstance(data, dict):
+        raise ValueError("cada pedido deve ser um objeto JSON")
+    name = (data.get("customer_name") or "").strip()
+    item = (data.get("item") or "").strip()
+    try:
+        amount = int(data.get("amount_cents") or 0)
+    except (TypeError, ValueError):
+        amount = 0
+
+    if not name or not item or amount <= 0:
+        raise ValueError("customer_name, item e amount_cents (>0) são obrigatórios")
+
+    created_at = dt.datetime.utcnow()
+    order = Order(
+        id=new_order_id(created_at),
+        customer_name=name,
+        item=item,
+        amount_cents=amount,
+        status="PENDING",
+        created_at=created_at,
+    )
+    payload = {
+        "event": "order.created",
+        "order_id": order.id,
+        "customer_name": order.customer_name,
+        "item": order.item,
+        "amount_cents": order.amount_cents,
+        "created_at": order.created_at.isoformat() + "Z",
+    }
+    return order, payload
+
+def parse_batch(body: bytes, ndjson: bool) -> list:
+    # corpo de POST /orders:batch: array JSON ou uma linha NDJSON por pedido
+    if ndjson:
+        items = []
+        for n, line in enumerate(body.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"linha {n} não é JSON válido")
+        return items
+    try:
+        items = json.loads(body)
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        raise ValueError("o corpo deve ser um array JSON ou NDJSON")
+    return items
+
+def build_batch(items: list, headers: dict) -> tuple[list, list, list]:
+    # (resultados por índice, linhas de orders, linhas do outbox) para os dois
+    # INSERTs multi-linha; itens inválidos só entram nos resultados
+    results, orders, outbox_rows = [], [], []
+    for index, data in enumerate(items):
+        try:
+            order, payload = build_order(data)
+        except ValueError as e:
+            results.append({"index": index, "status": 400, "error": str(e)})
+            continue
+        orders.append({c: getattr(order, c) for c in ORDER_COLUMNS})
+        outbox_rows.append({"routing_key": "order.created", "payload": payload, "headers": headers,
+                            "created_at": order.created_at})
+        results.append({"index": index, "status": 201, "order": order.to_dict()})
+    return results, orders, outbox_rows
+
+def batch_status(created: int, total: int) -> int:
+    if created == total:
+        return 201
+    return 207 if created else 400
+
+def encode_cursor(obj: Order) -> str:
+    raw = f"{obj.created_at.isoformat()}|{obj.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> tuple[dt.datetime, str]:
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return dt.datetime.fromisoformat(created_at), order_id
+    except Exception:
+        raise ValueError("cursor inválido")
+
+def int_arg(args, name: str, default=None):
+    try:
+        return int(args.get(name))
+    except (TypeError, ValueError):
+        return default
+
+def _time_arg(args, name: str):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return dt.datetime.fromisoformat(value.rstrip("Z"))
+    except ValueError:
+        raise ValueError(f"{name} deve ser uma data ISO-8601")
+
+def default_created_from(args, partitioned: bool):
+    # Janela padrão só para a listagem paginada com orders particionada. O
+    # export ndjson, o SQLite e a tabela sem partições leem o histórico todo.
+    if not partitioned or not ORDER_LIST_DEFAULT_DAYS:
+        return None
+    if args.get("format") == "ndjson" or args.get("created_from"):
+        return None
+    return dt.datetime.utcnow() - dt.timedelta(days=ORDER_LIST_DEFAULT_DAYS)
+
+def orders_query(args, default_from: dt.datetime = None):
+    # filtros e cursor de GET /orders; args é o request.args do Flask ou o
+    # query_params do Starlette. ValueError vira 400
+    stmt = select(Order)
+    status = args.get("status")
+    if status:
+        stmt = stmt.where(Order.status == status.upper())
+    customer = args.get("customer_name")
+    if customer:
+        stmt = stmt.where(Order.customer_name == customer)
+    created_from = _time_arg(args, "created_from") or default_from
+    if created_from:
+        stmt = stmt.where(Order.created_at >= created_from)
+    created_to = _time_arg(args, "created_to")
+    if created_to:
+        stmt = stmt.where(Order.created_at < created_to)
+    cursor = args.get("cursor")
+    if cursor:
+        stmt = stmt.where(tuple_(Order.created_at, Order.id) < tuple_(*decode_cursor(cursor)))
+    return stmt.order_by(Order.created_at.desc(), Order.id.desc())
+
+def list_limit(args) -> int:
+    return max(1, min(int_arg(args, "limit", LIST_DEFAULT_LIMIT), LIST_MAX_LIMIT))
+
+def list_page(rows: list, limit: int) -> tuple[list, str]:
+    # a consulta traz limit + 1 linhas; a sobra indica que há próxima página
+    cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return [o.to_dict() for o in rows[:limit]], cursor
+
+def payment_transitions(messages: list[dict]) -> tuple[set, set]:
+    # PAID sempre vence; CANCELLED só a partir de PENDING. Dentro do lote um
+    # succeeded prevalece sobre um failed do mesmo pedido, em qualquer ordem.
+    paid, cancelled = set(), set()
+    for message in messages:
+        event = (message.get("event") or "").strip()
+        order_id = (message.get("order_id") or "").strip()
+        if not event or not order_id:
+            continue
+        if event == "payment.succeeded":
+            paid.add(order_id)
+        elif event == "payment.failed":
+            cancelled.add(order_id)
+    return paid, cancelled - paid
+
+def status_updates(paid: set, cancelled: set) -> list:
+    # listas ordenadas: lotes concorrentes travam as linhas na mesma ordem
+    stmts = []
+    if paid:
+        stmts.append(
+            update(Order)
+            .where(*order_key(paid), Order.status != "PAID")
+            .values(status="PAID")
+            .execution_options(synchronize_session=False)
+        )
+    if cancelled:
+        stmts.append(
+            update(Order)
+            .where(*order_key(cancelled), Order.status == "PENDING")
+            .values(status="CANCELLED")
+            .execution_options(synchronize_session=False)
+        )
+    return stmts
@@ -0,0 +1,171 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import datetime as dt
+from sqlalchemy import select, func, delete
+from models import OutboxEvent, SessionLocal
+from events import publish_events
+from metrics import register_collector
+import tracing
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_FLUSH_INTERVAL = float(os.getenv("OUTBOX_FLUSH_INTERVAL", "0.05"))
+OUTBOX_RELAY_WORKERS = int(os.getenv("OUTBOX_RELAY_WORKERS", "2"))
+
+_wakeup = threading.Event()
+_stats_lock = threading.Lock()
+_stats = {
+    "published_total": 0,
+    "batches_total": 0,
+    "errors_total": 0,
+    "last_batch_size": 0,
+    "last_lag_ms": 0.0,
+}
+
+_async_wakeup = None
+
+def notify():
+    _wakeup.set()
+    if _async_wakeup is not None:
+        _async_wakeup.set()
+
+def _select_batch(batch_size: int):
+    # SKIP LOCKED deixa vários relays drenarem a tabela em paralelo sem
+    # publicar a mesma linha duas vezes; no SQLite a cláusula é ignorada.
+    return (
+        select(OutboxEvent)
+        .order_by(OutboxEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+def _snapshot(rows) -> list[tuple]:
+    # (routing_key, headers, created_at) lidos antes do commit: depois dele as
+    # instâncias estão expiradas e a sessão fechada
+    return [(r.routing_key, r.headers, r.created_at) for r in rows]
+
+def _record(rows: list[tuple]):
+    if tracing.enabled():
+        now = time.time()
+        for routing_key, headers, created_at in rows:
+            parent = tracing.extract(headers)
+            if parent:
+                created = created_at.replace(tzinfo=dt.timezone.utc).timestamp()
+                tracing.record_span("outbox.wait", parent, created, now, routing_key=routing_key)
+
+    lag_ms = (dt.datetime.utcnow() - rows[0][2]).total_seconds() * 1000
+    with _stats_lock:
+        _stats["published_total"] += len(rows)
+        _stats["batches_total"] += 1
+        _stats["last_batch_size"] = len(rows)
+        _stats["last_lag_ms"] = lag_ms
+
+def drain_once(session_factory=SessionLocal, publish=publish_events, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    with session_factory() as s:
+        rows = s.execute(_select_batch(batch_size)).scalars().all()
+        if not rows:
+            return 0
+
+        publish([(r.routing_key, r.payload, r.headers) for r in rows])
+        published = _snapshot(rows)
+        s.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([r.id for r in rows])))
+        s.commit()
+    _record(published)
+    return len(published)
+
+async def drain_once_async(session_factory, publish, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    # modo asyncio: sessão assíncrona e publish do aio_events.AsyncPublisher
+    async with session_factory() as s:
+        rows = (await s.execute(_select_batch(batch_size))).scalars().all()
+        if not rows:
+            return 0
+
+        await publish([(r.routing_key, r.payload, r.headers) for r in rows])
+        published = _snapshot(rows)
+        await s.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([r.id for r in rows])))
+        await s.commit()
+    _record(published)
+    return len(published)
+
+def stats(session_factory=SessionLocal) -> dict:
+    with session_factory() as s:
+        pending, oldest = s.execute(
+            select(func.count(OutboxEvent.id), func.min(OutboxEvent.created_at))
+        ).one()
+    with _stats_lock:
+        out = dict(_stats)
+    out["pending"] = pending
+    out["oldest_pending_age_ms"] = (
+        (dt.datetime.utcnow() - oldest).total_seconds() * 1000 if oldest else 0.0
+    )
+    return out
+
+@register_collector
+def _outbox_metrics():
+    st = stats()
+    return [
+        ("outbox_pending", "gauge", "Eventos no outbox aguardando publicação", [({}, st["pending"])]),
+        ("outbox_oldest_pending_age_seconds", "gauge", "Idade do evento pendente mais antigo",
+         [({}, st["oldest_pending_age_ms"] / 1000)]),
+        ("outbox_last_lag_seconds", "gauge", "Atraso entre commit e publish no último lote",
+         [({}, st["last_lag_ms"] / 1000)]),
+        ("outbox_published_total", "counter", "Eventos publicados pelo relay", [({}, st["published_total"])]),
+        ("outbox_relay_errors_total", "counter", "Falhas do relay", [({}, st["errors_total"])]),
+    ]
+
+def start_relay(workers: int = OUTBOX_RELAY_WORKERS, batch_size: int = OUTBOX_BATCH_SIZE,
+                flush_interval: float = OUTBOX_FLUSH_INTERVAL):
+    def _run():
+        while True:
+            try:
+                n = drain_once(batch_size=batch_size)
+            except Exception as e:
+                with _stats_lock:
+                    _stats["errors_total"] += 1
+                logger.warning("outbox relay falhou: %s", e)
+                time.sleep(1)
+                continue
+            if n < batch_size:
+                _wakeup.wait(flush_interval)
+                _wakeup.clear()
+
+    for i in range(max(1, workers)):
+        threading.Thread(target=_run, name=f"outbox-relay-{i}", daemon=True).start()
+
+def start_relay_async(session_factory, publish, workers: int = OUTBOX_RELAY_WORKERS,
+                      batch_size: int = OUTBOX_BATCH_SIZE, flush_interval: float = OUTBOX_FLUSH_INTERVAL):
+    # tasks no loop do asgi; notify() é chamado do próprio loop nesse modo
+    global _async_wakeup
+    _async_wakeup = asyncio.Event()
+    stopping = asyncio.Event()
+
+    async def _run():
+        while not stopping.is_set():
+            try:
+                n = await drain_once_async(session_factory, publish, batch_size=batch_size)
+            except Exception as e:
+                with _stats_lock:
+                    _stats["errors_total"] += 1
+                logger.warning("outbox relay falhou: %s", e)
+                await asyncio.sleep(1)
+                continue
+            if n < batch_size:
+                try:
+                    await asyncio.wait_for(_async_wakeup.wait(), flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                _async_wakeup.clear()
+
+    tasks = [asyncio.create_task(_run(), name=f"outbox-relay-{i}") for i in range(max(1, workers))]
+
+    async def stop():
+        # termina o lote em andamento em vez de cancelar no meio da transação
+        stopping.set()
+        _async_wakeup.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return stop
@@ -0,0 +1,272 @@
+import os, re, gzip, time, logging, threading
+import datetime as dt
+from sqlalchemy import text
+from models import Order, engine, ORDERS_PARTITIONING
+from metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+# Partições de tempo da tabela orders (só Postgres, ORDERS_PARTITIONING=true).
+# ensure_partitions cria a do período atual e ORDERS_PARTITIONS_AHEAD à frente;
+# archive_partitions tira da tabela as que terminaram há mais de
+# ORDERS_RETENTION_DAYS. Não há partição DEFAULT: ela impede o DETACH
+# CONCURRENTLY e esconderia uma manutenção parada.
+ORDERS_PARTITION_INTERVAL = os.getenv("ORDERS_PARTITION_INTERVAL", "month")  # day|week|month
+ORDERS_PARTITIONS_AHEAD = int(os.getenv("ORDERS_PARTITIONS_AHEAD", "3"))
+ORDERS_RETENTION_DAYS = int(os.getenv("ORDERS_RETENTION_DAYS", "365"))  # 0 = nunca arquiva
+# detach: vira tabela comum no schema ORDERS_ARCHIVE_SCHEMA (e no
+# ORDERS_ARCHIVE_TABLESPACE, se houver, ex.: disco mais barato);
+# export: COPY para <ORDERS_ARCHIVE_DIR>/<partição>.csv.gz e DROP
+ORDERS_ARCHIVE_MODE = os.getenv("ORDERS_ARCHIVE_MODE", "detach")
+ORDERS_ARCHIVE_SCHEMA = os.getenv("ORDERS_ARCHIVE_SCHEMA", "orders_archive")
+ORDERS_ARCHIVE_TABLESPACE = os.getenv("ORDERS_ARCHIVE_TABLESPACE", "")
+ORDERS_ARCHIVE_DIR = os.getenv("ORDERS_ARCHIVE_DIR", "/var/lib/msdemo/archive")
+ORDERS_MAINTENANCE_INTERVAL = float(os.getenv("ORDERS_MAINTENANCE_INTERVAL", "3600"))
+
+# advisory locks: o DDL de partição de processos diferentes (gunicorn,
+# worker.py, a ferramenta) nunca roda ao mesmo tempo
+_DDL_LOCK = 74200
+_MAINTENANCE_LOCK = 74201
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+_stats = {"runs_total": 0, "created_total": 0, "archived_total": 0, "errors_total": 0, "partitions": None}
+
+
+def period_start(day: dt.date, interval: str = ORDERS_PARTITION_INTERVAL) -> dt.date:
+    if interval == "day":
+        return day
+    if interval == "week":
+        return day - dt.timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period(start: dt.date, interval: str = ORDERS_PARTITION_INTERVAL) -> dt.date:
+    if interval == "day":
+        return start + dt.timedelta(days=1)
+    if interval == "week":
+        return start + dt.timedelta(days=7)
+    return (start.replace(day=28) + dt.timedelta(days=4)).replace(day=1)
+
+
+def partition_name(start: dt.date) -> str:
+    return f"orders_p{start:%Y%m%d}"
+
+
+def enabled(engine=engine) -> bool:
+    return ORDERS_PARTITIONING and engine.dialect.name == "postgresql"
+
+
+def is_partitioned(conn) -> bool:
+    return conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('orders')")).scalar() == "p"
+
+
+_orders_partitioned = None
+
+
+def orders_partitioned(engine=engine) -> bool:
+    # enabled() e a tabela de fato particionada: um banco antigo fica sem
+    # partições até o migrate (que pede os serviços parados). Consultado uma
+    # vez por processo.
+    global _orders_partitioned
+    if _orders_partitioned is None:
+        if not enabled(engine):
+            _orders_partitioned = False
+        else:
+            with engine.connect() as conn:
+                _orders_partitioned = is_partitioned(conn)
+    return _orders_partitioned
+
+
+def list_partitions(conn) -> list[dict]:
+    rows = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), i.inhdetachpending,
+               greatest(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'orders'::regclass
+        ORDER BY 1
+    """)).all()
+    out = []
+    for name, bound, detach_pending, rows_estimate, size in rows:
+        m = _BOUND_RE.search(bound or "")
+        start, end = (dt.datetime.fromisoformat(m.group(1)), dt.datetime.fromisoformat(m.group(2))) if m else (None, None)
+        out.append({"name": name, "start": start, "end": end, "detach_pending": detach_pending,
+                    "rows_estimate": rows_estimate, "bytes": size})
+    return out
+
+
+def _create_partitions(conn, first: dt.date, last: dt.date) -> list[str]:
+    # períodos de first até last (inclusive); pula os que já têm partição
+    # cobrindo o intervalo (ex.: depois de trocar ORDERS_PARTITION_INTERVAL)
+    conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _DDL_LOCK})
+    existing = [(p["start"], p["end"]) for p in list_partitions(conn) if p["start"]]
+    created = []
+    start = period_start(first)
+    while start <= last:
+        end = next_period(start)
+        lo, hi = dt.datetime.combine(start, dt.time()), dt.datetime.combine(end, dt.time())
+        if not any(s < hi and lo < e for s, e in existing):
+            conn.execute(text(f"CREATE TABLE {partition_name(start)} PARTITION OF orders "
+                              f"FOR VALUES FROM ('{lo.isoformat(' ')}') TO ('{hi.isoformat(' ')}')"))
+            created.append(partition_name(start))
+        start = end
+    return created
+
+
+def ensure_partitions(engine=engine, now: dt.datetime = None, ahead: int = ORDERS_PARTITIONS_AHEAD) -> list[str]:
+    if not enabled(engine):
+        return []
+    today = (now or dt.datetime.utcnow()).date()
+    last = today
+    for _ in range(ahead):
+        last = next_period(period_start(last))
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            logger.warning("tabela orders não é particionada; migre com tools/orders_partitions.py migrate")
+            return []
+        created = _create_partitions(conn, today, last)
+    if created:
+        logger.info("partições criadas: %s", ", ".join(created))
+    return created
+
+
+def _export(conn, name: str) -> str:
+    os.makedirs(ORDERS_ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ORDERS_ARCHIVE_DIR, f"{name}.csv.gz")
+    sql = f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER true)"
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        with gzip.open(path + ".tmp", "wb") as f:
+            if hasattr(cursor, "copy_expert"):  # psycopg2
+                cursor.copy_expert(sql, f)
+            else:  # psycopg 3
+                with cursor.copy(sql) as copy:
+                    for data in copy:
+                        f.write(data)
+    finally:
+        cursor.close()
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def archive_partition(name: str, mode: str = ORDERS_ARCHIVE_MODE, engine=engine) -> str:
+    # DETACH CONCURRENTLY não trava as leituras/escritas nas outras partições,
+    # mas não roda dentro de transação
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        pending = {p["name"]: p["detach_pending"] for p in list_partitions(conn)}
+        if name not in pending:
+            raise ValueError(f"{name} não é uma partição de orders")
+        path = _export(conn, name) if mode == "export" else None
+        if pending[name]:
+            # DETACH CONCURRENTLY interrompido numa execução anterior
+            conn.execute(text(f"ALTER TABLE orders DETACH PARTITION {name} FINALIZE"))
+        else:
+            conn.execute(text(f"ALTER TABLE orders DETACH PARTITION {name} CONCURRENTLY"))
+        if mode == "export":
+            conn.execute(text(f"DROP TABLE {name}"))
+            return path
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ORDERS_ARCHIVE_SCHEMA}"))
+        conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ORDERS_ARCHIVE_SCHEMA}"))
+        if ORDERS_ARCHIVE_TABLESPACE:
+            conn.execute(text(f"ALTER TABLE {ORDERS_ARCHIVE_SCHEMA}.{name} SET TABLESPACE {ORDERS_ARCHIVE_TABLESPACE}"))
+        return f"{ORDERS_ARCHIVE_SCHEMA}.{name}"
+
+
+def archive_candidates(engine=engine, now: dt.datetime = None, retention_days: int = ORDERS_RETENTION_DAYS) -> list[str]:
+    if not enabled(engine) or not retention_days:
+        return []
+    cutoff = (now or dt.datetime.utcnow()) - dt.timedelta(days=retention_days)
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return []
+        return [p["name"] for p in list_partitions(conn) if p["end"] and p["end"] <= cutoff]
+
+
+def archive_partitions(engine=engine, now: dt.datetime = None, retention_days: int = ORDERS_RETENTION_DAYS,
+                       mode: str = ORDERS_ARCHIVE_MODE) -> list[str]:
+    archived = []
+    for name in archive_candidates(engine, now, retention_days):
+        target = archive_partition(name, mode, engine)
+        logger.info("partição %s arquivada em %s", name, target)
+        archived.append(target)
+    return archived
+
+
+def migrate(engine=engine) -> int:
+    # tabela orders criada antes do particionamento: renomeia, cria a nova
+    # particionada com partições cobrindo todo o histórico e copia as linhas,
+    # numa transação só (rode com os serviços parados)
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            return 0
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _DDL_LOCK})
+        conn.execute(text("ALTER TABLE orders RENAME TO orders_unpartitioned"))
+        # nomes de índice são únicos no schema: os antigos ganham sufixo
+        for (index,) in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = 'orders_unpartitioned'")).all():
+            conn.execute(text(f"ALTER INDEX {index} RENAME TO {index}_unpartitioned"))
+        Order.__table__.create(conn)
+        oldest = conn.execute(text("SELECT min(created_at) FROM orders_unpartitioned")).scalar()
+        today = dt.datetime.utcnow().date()
+        last = today
+        for _ in range(ORDERS_PARTITIONS_AHEAD):
+            last = next_period(period_start(last))
+        _create_partitions(conn, oldest.date() if oldest else today, last)
+        copied = conn.execute(text("""
+            INSERT INTO orders (id, customer_name, item, amount_cents, status, created_at)
+            SELECT id, customer_name, item, amount_cents, status, created_at FROM orders_unpartitioned
+        """)).rowcount
+    logger.info("orders migrada para tabela particionada (%s linhas); orders_unpartitioned pode ser apagada", copied)
+    return copied
+
+
+def run_maintenance(engine=engine) -> dict:
+    # só um processo por vez; os outros pulam esta rodada
+    with engine.connect() as conn:
+        locked = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": _MAINTENANCE_LOCK}).scalar()
+        # o lock é de sessão; sem transação aberta aqui o DETACH CONCURRENTLY não espera por esta conexão
+        conn.commit()
+        if not locked:
+            return {}
+        try:
+            created = ensure_partitions(engine)
+            archived = archive_partitions(engine)
+            _stats["partitions"] = len(list_partitions(conn))
+        finally:
+            conn.commit()
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _MAINTENANCE_LOCK})
+            conn.commit()
+    _stats["runs_total"] += 1
+    _stats["created_total"] += len(created)
+    _stats["archived_total"] += len(archived)
+    return {"created": created, "archived": archived}
+
+
+def start_maintenance(interval: float = ORDERS_MAINTENANCE_INTERVAL, engine=engine):
+    # junto com os consumers (worker.py): cria as partições à frente e arquiva
+    # as antigas a cada ORDERS_MAINTENANCE_INTERVAL
+    if not enabled(engine):
+        return
+
+    def _run():
+        while True:
+            try:
+                run_maintenance(engine)
+            except Exception as e:
+                _stats["errors_total"] += 1
+                logger.warning("manutenção das partições de orders falhou: %s", e)
+            time.sleep(interval)
+
+    threading.Thread(target=_run, name="orders-partitions", daemon=True).start()
+
+
+def stats() -> dict:
+    return dict(_stats)
+
+
+@register_collector
+def _partition_metrics():
+    st = stats()
+    return [
+        ("orders_partitions", "gauge", "Partições anexadas à tabela orders", [({}, st["partitions"])]),
+        ("orders_partition_maintenance_total", "counter", "Resultado da manutenção das partições de orders",
+         [({"result": k[:-len("_total")]}, st[k]) for k in ("runs_total", "created_total", "archived_total", "errors_total")]),
+    ]
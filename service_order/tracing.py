@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Propagação W3C traceparent ("00-<trace_id>-<span_id>-01") pelos headers AMQP
+# e HTTP. TRACE_EXPORT="" desliga; "memory" guarda os últimos spans em memória;
+# qualquer outro valor é um arquivo JSONL onde os spans são acrescentados.
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "")
+TRACE_MEMORY_SIZE = int(os.getenv("TRACE_MEMORY_SIZE", "10000"))
+PUBLISHED_AT_HEADER = "x-published-at"
+
+_service = "unknown"
+_current: ContextVar = ContextVar("trace_context", default=None)
+_memory: deque = deque(maxlen=TRACE_MEMORY_SIZE)
+_file_lock = threading.Lock()
+
+def enabled() -> bool:
+    return bool(TRACE_EXPORT)
+
+def init(service: str):
+    global _service
+    _service = service
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+def parse_traceparent(value):
+    try:
+        _, trace_id, span_id, _ = value.split("-")
+        if len(trace_id) == 32 and len(span_id) == 16:
+            return trace_id, span_id
+    except (AttributeError, ValueError):
+        pass
+    return None
+
+def current_traceparent():
+    ctx = _current.get()
+    return f"00-{ctx[0]}-{ctx[1]}-01" if ctx else None
+
+def _export(record: dict):
+    if TRACE_EXPORT == "memory":
+        _memory.append(record)
+        return
+    line = json.dumps(record) + "\n"
+    with _file_lock:
+        with open(TRACE_EXPORT, "a", encoding="utf-8") as f:
+            f.write(line)
+
+def record_span(name: str, parent, start: float, end: float, **attrs):
+    # span com início/fim já conhecidos (ex.: espera na fila, espera no outbox)
+    if not enabled():
+        return None
+    trace_id = parent[0] if parent else _new_id(16)
+    span_id = _new_id(8)
+    _export({
+        "trace_id": trace_id,
+        "span_id": span_id,
+        "parent_id": parent[1] if parent else None,
+        "name": name,
+        "service": _service,
+        "start": start,
+        "duration_ms": (end - start) * 1000,
+        "attrs": attrs,
+    })
+    return trace_id, span_id
+
+@contextmanager
+def span(name: str, parent=None, **attrs):
+    if not enabled():
+        yield None
+        return
+    parent = parent or _current.get()
+    ctx = (parent[0] if parent else _new_id(16), _new_id(8))
+    token = _current.set(ctx)
+    start = time.time()
+    t0 = time.perf_counter()
+    try:
+        yield ctx
+    finally:
+        _current.reset(token)
+        _export({
+            "trace_id": ctx[0],
+            "span_id": ctx[1],
+            "parent_id": parent[1] if parent else None,
+            "name": name,
+            "service": _service,
+            "start": start,
+            "duration_ms": (time.perf_counter() - t0) * 1000,
+            "attrs": attrs,
+        })
+
+def inject(headers: dict) -> dict:
+    traceparent = current_traceparent()
+    if traceparent:
+        headers["traceparent"] = traceparent
+    return headers
+
+def extract(headers) -> tuple | None:
+    if not headers:
+        return None
+    return parse_traceparent(headers.get("traceparent"))
+
+def queue_wait(headers, queue: str):
+    # tempo entre o publish (header x-published-at) e a entrega ao consumer
+    parent = extract(headers)
+    published_at = (headers or {}).get(PUBLISHED_AT_HEADER)
+    if enabled() and parent and published_at:
+        record_span("queue.wait", parent, float(published_at), time.time(), queue=queue)
+    return parent
+
+def recent_spans(trace_id: str = None, limit: int = 1000) -> list[dict]:
+    spans = list(_memory)
+    if trace_id:
+        spans = [s for s in spans if s["trace_id"] == trace_id]
+    return spans[-limit:]
+
+def instrument_flask(app):
+    from flask import g, request, jsonify
+
+    @app.before_request
+    def _start_span():
+        if not enabled():
+            return
+        route = request.url_rule.rule if request.url_rule else request.path
+        cm = span(f"HTTP {request.method} {route}", parent=parse_traceparent(request.headers.get("traceparent")))
+        cm.__enter__()
+        g._trace_span = cm
+
+    @app.teardown_request
+    def _end_span(exc):
+        cm = g.pop("_trace_span", None)
+        if cm is not None:
+            cm.__exit__(None, None, None)
+
+    @app.after_request
+    def _traceparent_header(response):
+        traceparent = current_traceparent()
+        if traceparent:
+            response.headers["traceparent"] = traceparent
+        return response
+
+    @app.get("/traces")
+    def traces():
+        return jsonify(recent_spans(request.args.get("trace_id"), request.args.get("limit", 1000, type=int)))
+
+def instrument_asgi(app):
+    from starlette.routing import Match
+
+    def _route(scope) -> str:
+        for route in app.routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return route.path
+        return scope["path"]
+
+    async def _app(scope, receive, send):
+        if scope["type"] != "http" or not enabled():
+            return await app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        parent = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                traceparent = current_traceparent()
+                if traceparent:
+                    message.setdefault("headers", []).append((b"traceparent", traceparent.encode("latin-1")))
+            await send(message)
+
+        with span(f"HTTP {scope['method']} {_route(scope)}", parent=parent):
+            await app(scope, receive, _send)
+
+    _app.routes = app.routes
+    return _app
@@ -0,0 +1,81 @@
+import argparse, logging, os, signal, sys, time
+
+# Processo dedicado aos consumers (e, no service_order, ao relay do outbox).
+# Escala independente do gunicorn: python worker.py --processes 2 --concurrency 4
+# sobe 2 processos com 4 workers AMQP cada, sem duplicar nada nos processos web.
+
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("worker")
+
+def _run():
+    t0 = time.perf_counter()
+    # o fork herda o pool do pai (init_db); cada processo abre as suas conexões
+    from models import engine
+    engine.dispose(close=False)
+    import app
+    app.start_consumers()
+    logger.info("worker %s consumindo (pronto em %.0f ms)", os.getpid(), (time.perf_counter() - t0) * 1000)
+
+    # SIGTERM -> SystemExit -> atexit do events.stop_consumers drena o que
+    # estiver em andamento
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    try:
+        while True:
+            signal.pause()
+    except KeyboardInterrupt:
+        pass
+
+def _spawn() -> int:
+    pid = os.fork()
+    if pid == 0:
+        # o filho nunca volta para o supervisor: o SystemExit sobe até o
+        # interpretador, que roda os atexit (drain dos consumers, flush)
+        _run()
+        sys.exit(0)
+    return pid
+
+def main():
+    ap = argparse.ArgumentParser(description="Consumers fora do processo web")
+    ap.add_argument("--processes", type=int, default=WORKER_PROCESSES, help="Processos de consumer")
+    ap.add_argument("--concurrency", type=int, help="Workers AMQP por processo (CONSUMER_CONCURRENCY)")
+    args = ap.parse_args()
+    if args.concurrency:
+        os.environ["CONSUMER_CONCURRENCY"] = str(args.concurrency)
+
+    from models import init_db
+    init_db()
+
+    if args.processes <= 1:
+        _run()
+        return
+
+    children = {_spawn() for _ in range(args.processes)}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            logger.warning("worker %s saiu (status %s); subindo outro", pid, status)
+            time.sleep(1)
+            children.add(_spawn())
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,144 @@
-import os, uuid, random, datetime as dt, threading, logging
-from flask import Flask, request, jsonify, abort
-from events import publish_event, start_consumer, ensure_bindings
-
-logging.basicConfig(level=logging.INFO)
-PAYMENT_CONSUMER_ENABLED = os.getenv("PAYMENT_CONSUMER_ENABLED", "true").lower() in ("1","true","yes")
-logger = logging.getLogger(__name__)
-
-app = Flask(__name__)
-
-@app.get("/health")
-def health():
-    return {"status": "ok"}
-
-def _pay(order_id: str, amount_cents: int) -> dict:
-    status = "SUCCESS" if amount_cents > 0 else "FAILED"
-    event_key = "payment.succeeded" if status == "SUCCESS" else "payment.failed"
-    payload = {
-        "event": event_key,
-        "order_id": order_id,
-        "payment_id": str(uuid.uuid4()),
-        "amount_cents": amount_cents,
-        "at": dt.datetime.utcnow().isoformat() + "Z",
-        "idempotency_key": order_id,
-    }
-    publish_event(event_key, payload)
-    return payload
-
-@app.post("/payments")
-def create_payment():
-    data = request.get_json(force=True) or {}
-    order_id = (data.get("order_id") or "").strip()
-    amount = int(data.get("amount_cents") or 0)
-    if not order_id or amount <= 0:
-        abort(400, description="order_id e amount_cents (>0) são obrigatórios")
-    payload = _pay(order_id, amount)
-    return jsonify(payload), 201
-
-def _on_order_created(msg: dict):
-    if (msg.get("event") or "") != "order.created":
-        return
-    order_id = (msg.get("order_id") or "").strip()
-    amount = int(msg.get("amount_cents") or 0)
-    if not order_id:
-        return
-    _pay(order_id, amount)
-
-_CONSUMER_STARTED = False
-
-def _bootstrap_broker_async():
-    def runner():
-        global _CONSUMER_STARTED
-        ok = ensure_bindings(queue="payments.orders", binding_keys=["order.created"])
-        if PAYMENT_CONSUMER_ENABLED and not _CONSUMER_STARTED:
-            start_consumer(queue="payments.orders", binding_keys=["order.created"], handler=_on_order_created)
-            _CONSUMER_STARTED = True
-            logger.info("consumer 'order.created' iniciado (enabled=%s, bindings_ok=%s)", PAYMENT_CONSUMER_ENABLED, ok)
-        else:
-            logger.info("consumer DESLIGADO (enabled=%s); bindings_ok=%s", PAYMENT_CONSUMER_ENABLED, ok)
-    threading.Thread(target=runner, daemon=True).start()
-
-_bootstrap_broker_async()
-
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000)
+import os, random, threading, logging
+from flask import Flask, request, jsonify, abort
+from events import publish_event, start_consumer, ensure_bindings, consumer_stats
+from models import init_db, pool_stats
+from idempotency import IdempotencyStore
+from repository import PaymentRepository, new_payment
+from metrics import instrument_flask, register_collector
+import tracing
+
+logging.basicConfig(level=logging.INFO)
+PAYMENT_CONSUMER_ENABLED = os.getenv("PAYMENT_CONSUMER_ENABLED", "true").lower() in ("1","true","yes")
+# consumer no próprio processo web (gunicorn -w 1 ou python app.py sem
+# worker.py); com gunicorn -w N o normal é deixar isso para o worker.py
+WEB_CONSUMERS = os.getenv("WEB_CONSUMERS", "false").lower() in ("1","true","yes")
+logger = logging.getLogger(__name__)
+
+idempotency = IdempotencyStore()
+payments = PaymentRepository()
+
+tracing.init("service_payment")
+
+app = Flask(__name__)
+instrument_flask(app)
+tracing.instrument_flask(app)
+
+@register_collector
+def _store_metrics():
+    cache, writer = idempotency.stats(), payments.stats()
+    return [
+        ("idempotency_cache_events_total", "counter", "Consultas ao cache de idempotência",
+         [({"result": k}, cache[k]) for k in ("hits", "misses", "evictions")]),
+        ("idempotency_cache_size", "gauge", "Entradas no cache de idempotência", [({}, cache["size"])]),
+        ("payments_write_buffered", "gauge", "Pagamentos aguardando o próximo flush", [({}, writer["buffered"])]),
+        ("payments_written_total", "counter", "Pagamentos gravados no payments_db", [({}, writer["written_total"])]),
+        ("payments_write_errors_total", "counter", "Flushes de pagamentos que falharam", [({}, writer["errors_total"])]),
+    ]
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.get("/consumers/stats")
+def consumers_stats():
+    return jsonify(consumer_stats())
+
+@app.get("/db/stats")
+def db_stats():
+    return jsonify(pool_stats())
+
+@app.get("/idempotency/stats")
+def idempotency_stats():
+    return jsonify(idempotency.stats())
+
+def _pay(order_id: str, amount_cents: int, buffered: bool = False) -> tuple[dict, bool]:
+    # Retorna (payload, criado). Chave complete devolve o resultado gravado
+    # sem publicar. Chave pending (o processo caiu, ou o publish falhou, entre
+    # o claim e a gravação do pagamento) publica de novo o mesmo payload.
+    stored = idempotency.get(order_id)
+    created = stored is None
+    if created:
+        payload = new_payment(order_id, amount_cents)
+        stored = idempotency.claim(order_id, payload)
+        created = stored[0] is payload
+    payload, complete = stored
+    if complete:
+        return payload, False
+    publish_event(payload["event"], payload)
+    if buffered:
+        payments.add(payload)
+    else:
+        payments.save(payload)
+    return payload, created
+
+@app.post("/payments")
+def create_payment():
+    data = request.get_json(force=True) or {}
+    order_id = (data.get("order_id") or "").strip()
+    amount = int(data.get("amount_cents") or 0)
+    if not order_id or amount <= 0:
+        abort(400, description="order_id e amount_cents (>0) são obrigatórios")
+    payload, created = _pay(order_id, amount)
+    return jsonify(payload), 201 if created else 200
+
+@app.get("/payments/<payment_id>")
+def get_payment(payment_id: str):
+    obj = payments.get(payment_id)
+    if not obj:
+        abort(404, description="payment not found")
+    return jsonify(obj)
+
+@app.get("/payments")
+def list_payments():
+    order_id = (request.args.get("order_id") or "").strip()
+    if not order_id:
+        abort(400, description="order_id é obrigatório")
+    return jsonify(payments.list_by_order(order_id))
+
+@app.get("/payments/stats")
+def payments_stats():
+    return jsonify(payments.stats())
+
+def _on_order_created(msg: dict):
+    if (msg.get("event") or "") != "order.created":
+        return
+    order_id = (msg.get("order_id") or "").strip()
+    amount = int(msg.get("amount_cents") or 0)
+    if not order_id:
+        return
+    _pay(order_id, amount, buffered=True)
+
+def _on_orders_created(messages: list[dict]):
+    # o consumer só confirma o lote depois do flush: um pagamento nunca fica
+    # só no buffer em memória com a mensagem já confirmada
+    for msg in messages:
+        _on_order_created(msg)
+    payments.flush()
+
+_CONSUMER_STARTED = False
+
+def start_consumers():
+    # worker.py (ou o processo web com WEB_CONSUMERS=true); o buffer de
+    # escrita só é usado pelo consumer
+    payments.start()
+
+    def runner():
+        global _CONSUMER_STARTED
+        ok = ensure_bindings(queue="payments.orders", binding_keys=["order.created"])
+        if PAYMENT_CONSUMER_ENABLED and not _CONSUMER_STARTED:
+            start_consumer(queue="payments.orders", binding_keys=["order.created"], batch_handler=_on_orders_created)
+            _CONSUMER_STARTED = True
+            logger.info("consumer 'order.created' iniciado (enabled=%s, bindings_ok=%s)", PAYMENT_CONSUMER_ENABLED, ok)
+        else:
+            logger.info("consumer DESLIGADO (enabled=%s); bindings_ok=%s", PAYMENT_CONSUMER_ENABLED, ok)
+    threading.Thread(target=runner, daemon=True).start()
+
+def start_web():
+    # chamado pelo gunicorn.conf.py em cada processo web, depois do fork
+    if WEB_CONSUMERS:
+        start_consumers()
+
+if __name__ == "__main__":
+    init_db()
+    start_web()
+    app.run(host="0.0.0.0", port=8000)
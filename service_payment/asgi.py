@@ -0,0 +1,141 @@
+import os, asyncio, logging
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+from models import create_async_session_factory, pool_stats
+from events import consumer_stats
+from aio_events import AsyncPublisher, start_consumer
+from idempotency import IdempotencyStore
+from repository import PaymentRepository, new_payment
+from metrics import instrument_asgi, render
+import tracing
+
+# Modo asyncio (SERVER_MODE=async) do app.py: Starlette + SQLAlchemy asyncio
+# (asyncpg) + aio-pika. O publish espera o confirm sem prender uma thread.
+
+logging.basicConfig(level=logging.INFO)
+PAYMENT_CONSUMER_ENABLED = os.getenv("PAYMENT_CONSUMER_ENABLED", "true").lower() in ("1","true","yes")
+WEB_CONSUMERS = os.getenv("WEB_CONSUMERS", "false").lower() in ("1","true","yes")
+logger = logging.getLogger(__name__)
+
+async_engine, AsyncSessionLocal = create_async_session_factory()
+idempotency = IdempotencyStore(async_session_factory=AsyncSessionLocal)
+payments = PaymentRepository(async_session_factory=AsyncSessionLocal)
+publisher = AsyncPublisher()
+
+tracing.init("service_payment")
+
+def _error(status: int, description: str) -> JSONResponse:
+    return JSONResponse({"error": description}, status_code=status)
+
+async def health(request: Request):
+    return JSONResponse({"status": "ok"})
+
+async def metrics(request: Request):
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+async def traces(request: Request):
+    limit = int(request.query_params.get("limit", 1000))
+    return JSONResponse(tracing.recent_spans(request.query_params.get("trace_id"), limit))
+
+async def db_stats(request: Request):
+    return JSONResponse(pool_stats(async_engine.sync_engine))
+
+async def consumers_stats(request: Request):
+    return JSONResponse(consumer_stats())
+
+async def idempotency_stats(request: Request):
+    return JSONResponse(idempotency.stats())
+
+async def payments_stats(request: Request):
+    return JSONResponse(payments.stats())
+
+async def _pay(order_id: str, amount_cents: int, buffered: bool = False) -> tuple[dict, bool]:
+    # mesma sequência do app._pay: claim pending -> publish -> gravação (complete)
+    stored = await idempotency.aget(order_id)
+    created = stored is None
+    if created:
+        payload = new_payment(order_id, amount_cents)
+        stored = await idempotency.aclaim(order_id, payload)
+        created = stored[0] is payload
+    payload, complete = stored
+    if complete:
+        return payload, False
+    await publisher.publish(payload["event"], payload, max_retries=8)
+    if buffered:
+        payments.add(payload)
+    else:
+        await payments.asave(payload)
+    return payload, created
+
+async def create_payment(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    data = data or {}
+    order_id = (data.get("order_id") or "").strip()
+    amount = int(data.get("amount_cents") or 0)
+    if not order_id or amount <= 0:
+        return _error(400, "order_id e amount_cents (>0) são obrigatórios")
+    payload, created = await _pay(order_id, amount)
+    return JSONResponse(payload, status_code=201 if created else 200)
+
+async def get_payment(request: Request):
+    obj = await payments.aget(request.path_params["payment_id"])
+    if not obj:
+        return _error(404, "payment not found")
+    return JSONResponse(obj)
+
+async def list_payments(request: Request):
+    order_id = (request.query_params.get("order_id") or "").strip()
+    if not order_id:
+        return _error(400, "order_id é obrigatório")
+    return JSONResponse(await payments.alist_by_order(order_id))
+
+async def _on_order_created(msg: dict):
+    if (msg.get("event") or "") != "order.created":
+        return
+    order_id = (msg.get("order_id") or "").strip()
+    amount = int(msg.get("amount_cents") or 0)
+    if not order_id:
+        return
+    await _pay(order_id, amount, buffered=True)
+
+async def _on_orders_created(messages: list[dict]):
+    # como no app.py: ack do lote só depois do flush dos pagamentos
+    for msg in messages:
+        await _on_order_created(msg)
+    await asyncio.to_thread(payments.flush)
+
+@asynccontextmanager
+async def lifespan(app):
+    # DDL no gunicorn.conf.py (master) ou no worker.py; aqui só o que é do processo
+    consumer = None
+    if WEB_CONSUMERS and PAYMENT_CONSUMER_ENABLED:
+        payments.start()
+        consumer = start_consumer(queue="payments.orders", binding_keys=["order.created"], batch_handler=_on_orders_created)
+        logger.info("consumer 'order.created' iniciado (modo asyncio)")
+    yield
+    if consumer is not None:
+        await consumer.aclose()
+    await publisher.close()
+    await async_engine.dispose()
+
+app = instrument_asgi(tracing.instrument_asgi(Starlette(
+    routes=[
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/traces", traces, methods=["GET"]),
+        Route("/consumers/stats", consumers_stats, methods=["GET"]),
+        Route("/db/stats", db_stats, methods=["GET"]),
+        Route("/idempotency/stats", idempotency_stats, methods=["GET"]),
+        Route("/payments/stats", payments_stats, methods=["GET"]),
+        Route("/payments", create_payment, methods=["POST"]),
+        Route("/payments", list_payments, methods=["GET"]),
+        Route("/payments/{payment_id}", get_payment, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)))
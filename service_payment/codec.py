@@ -0,0 +1,101 @@
+import json, logging, os
+
+logger = logging.getLogger(__name__)
+
+# Formato dos eventos no fio. O produtor usa EVENT_CODEC; o consumer decodifica
+# pelo content_type de cada mensagem, então dá para trocar o codec de um
+# serviço sem parar o outro (o consumer precisa só ter o pacote instalado).
+#   json    application/json     stdlib
+#   orjson  application/json     pacote orjson (mesmo formato, mais rápido)
+#   msgpack application/msgpack  pacote msgpack
+EVENT_CODEC = os.getenv("EVENT_CODEC", "orjson")
+
+# Versão do schema dos payloads, no header x-schema-version. Mensagens sem o
+# header são v1. Consumers só aceitam até SUPPORTED_SCHEMA_VERSION: numa
+# mudança de schema, sobe primeiro os consumers e depois EVENT_SCHEMA_VERSION
+# nos produtores. Versão desconhecida vai para o parking lot.
+SCHEMA_VERSION_HEADER = "x-schema-version"
+SUPPORTED_SCHEMA_VERSION = 1
+EVENT_SCHEMA_VERSION = int(os.getenv("EVENT_SCHEMA_VERSION", str(SUPPORTED_SCHEMA_VERSION)))
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+try:
+    import orjson  # dependência opcional
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # dependência opcional
+except ImportError:
+    msgpack = None
+
+
+def _json_dumps(payload: dict) -> bytes:
+    return json.dumps(payload).encode("utf-8")
+
+
+def _json_loads(body: bytes) -> dict:
+    return json.loads(body)
+
+
+def _orjson_loads(body: bytes) -> dict:
+    return orjson.loads(body)
+
+
+def _msgpack_loads(body: bytes) -> dict:
+    if msgpack is None:
+        raise ImportError("mensagem application/msgpack recebida mas o pacote msgpack não está instalado")
+    try:
+        return msgpack.unpackb(body)
+    except Exception as e:
+        # corpo malformado: erro permanente, vai direto para o parking lot
+        raise ValueError(f"msgpack inválido: {e}") from e
+
+
+def encoder(name: str = EVENT_CODEC):
+    # (função de encode, content_type)
+    if name == "msgpack" and msgpack is not None:
+        return msgpack.packb, MSGPACK
+    if name == "orjson" and orjson is not None:
+        return orjson.dumps, JSON
+    if name not in ("json", "orjson", "msgpack"):
+        raise ValueError(f"EVENT_CODEC inválido: {name}")
+    if name != "json":
+        logger.warning("EVENT_CODEC=%s mas o pacote não está instalado; usando json", name)
+    return _json_dumps, JSON
+
+
+_encode, CONTENT_TYPE = encoder()
+
+_decoders = {
+    JSON: _orjson_loads if orjson is not None else _json_loads,
+    "text/json": _orjson_loads if orjson is not None else _json_loads,
+    MSGPACK: _msgpack_loads,
+    "application/x-msgpack": _msgpack_loads,
+}
+
+
+def encode(payload: dict) -> bytes:
+    return _encode(payload)
+
+
+def decode(body: bytes, content_type: str = None, headers: dict = None) -> dict:
+    version = (headers or {}).get(SCHEMA_VERSION_HEADER, 1)
+    if int(version) > SUPPORTED_SCHEMA_VERSION:
+        raise ValueError(f"schema v{version} não suportado (até v{SUPPORTED_SCHEMA_VERSION})")
+    # sem content_type: mensagens antigas, sempre JSON
+    loads = _decoders.get((content_type or JSON).split(";")[0].strip().lower())
+    if loads is None:
+        raise ValueError(f"content_type não suportado: {content_type}")
+    msg = loads(body)
+    if not isinstance(msg, dict):
+        raise ValueError("evento não é um objeto")
+    return msg
+
+
+def headers(extra: dict = None) -> dict:
+    out = dict(extra or {})
+    out[SCHEMA_VERSION_HEADER] = EVENT_SCHEMA_VERSION
+    return out
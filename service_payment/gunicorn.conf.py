@@ -0,0 +1,28 @@
+import os, time, logging
+
+# Lido automaticamente pelo gunicorn (serve.py roda no diretório do serviço).
+# Nada de broker nem DDL no import do app: o schema é criado uma vez no master,
+# antes do fork, e cada worker HTTP só abre o que é dele.
+
+SERVER_MODE = os.getenv("SERVER_MODE", "sync")
+logger = logging.getLogger("gunicorn.error")
+
+def on_starting(server):
+    from models import init_db
+    t0 = time.perf_counter()
+    init_db()
+    logger.info("schema verificado em %.0f ms", (time.perf_counter() - t0) * 1000)
+
+def post_fork(server, worker):
+    # conexões que o master abriu no init_db não podem ser usadas por dois
+    # processos; close=False só esquece o pool herdado sem fechar os sockets
+    from models import engine
+    engine.dispose(close=False)
+    worker.forked_at = time.perf_counter()
+
+def post_worker_init(worker):
+    if SERVER_MODE == "sync":
+        import app
+        app.start_web()
+    logger.info("worker %s pronto em %.0f ms (import do app + start_web)",
+                worker.pid, (time.perf_counter() - worker.forked_at) * 1000)
@@ -0,0 +1,118 @@
+import os, time, threading
+from collections import OrderedDict
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from models import IdempotencyRecord, SessionLocal
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_CACHE_TTL = float(os.getenv("IDEMPOTENCY_CACHE_TTL", "3600"))
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+def complete_keys(session, keys: list[str]):
+    # chamado na mesma transação que grava os pagamentos (repository.py)
+    session.execute(update(IdempotencyRecord).where(IdempotencyRecord.key.in_(keys)).values(status="complete"))
+
+class IdempotencyStore:
+    # Tabela idempotency_keys no payments_db com um LRU/TTL em memória na frente.
+    # A chave nasce pending no claim e só fica complete quando o pagamento é
+    # gravado, depois do confirm do publish; só chaves complete vão para o cache.
+    def __init__(self, session_factory=SessionLocal, cache_size: int = IDEMPOTENCY_CACHE_SIZE,
+                 cache_ttl: float = IDEMPOTENCY_CACHE_TTL, async_session_factory=None):
+        self.session_factory = session_factory
+        # modo asyncio (asgi.py): mesmas operações com a*() e sessão assíncrona
+        self.async_session_factory = async_session_factory
+        self.cache = LRUCache(cache_size, cache_ttl)
+        self.db_hits = 0
+
+    def _found(self, key: str, rec: IdempotencyRecord) -> tuple[dict, bool]:
+        complete = rec.status == "complete"
+        if complete:
+            self.cache.set(key, rec.result)
+        return rec.result, complete
+
+    def get(self, key: str):
+        # (resultado, complete) ou None para chave nova
+        result = self.cache.get(key)
+        if result is not None:
+            return result, True
+        with self.session_factory() as s:
+            rec = s.get(IdempotencyRecord, key)
+            if rec is None:
+                return None
+            self.db_hits += 1
+            return self._found(key, rec)
+
+    def claim(self, key: str, result: dict) -> tuple[dict, bool]:
+        # Reserva a chave como pending. Se outra entrega concorrente chegou
+        # antes, devolve o resultado e o estado dela.
+        with self.session_factory() as s:
+            s.add(IdempotencyRecord(key=key, result=result, status="pending"))
+            try:
+                s.commit()
+            except IntegrityError:
+                s.rollback()
+                return self._found(key, s.get(IdempotencyRecord, key))
+        return result, False
+
+    async def aget(self, key: str):
+        result = self.cache.get(key)
+        if result is not None:
+            return result, True
+        async with self.async_session_factory() as s:
+            rec = await s.get(IdempotencyRecord, key)
+            if rec is None:
+                return None
+            self.db_hits += 1
+            return self._found(key, rec)
+
+    async def aclaim(self, key: str, result: dict) -> tuple[dict, bool]:
+        async with self.async_session_factory() as s:
+            s.add(IdempotencyRecord(key=key, result=result, status="pending"))
+            try:
+                await s.commit()
+            except IntegrityError:
+                await s.rollback()
+                return self._found(key, await s.get(IdempotencyRecord, key))
+        return result, False
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "db_hits": self.db_hits}
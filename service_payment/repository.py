@@ -0,0 +1,179 @@
+import os, time, uuid, threading, logging, atexit
+import datetime as dt
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from models import Payment, SessionLocal
+from idempotency import complete_keys
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_WRITE_BATCH_SIZE = int(os.getenv("PAYMENT_WRITE_BATCH_SIZE", "500"))
+PAYMENT_WRITE_FLUSH_INTERVAL = float(os.getenv("PAYMENT_WRITE_FLUSH_INTERVAL", "0.2"))
+
+def new_payment(order_id: str, amount_cents: int) -> dict:
+    event_key = "payment.succeeded" if amount_cents > 0 else "payment.failed"
+    return {
+        "event": event_key,
+        "order_id": order_id,
+        "payment_id": str(uuid.uuid4()),
+        "amount_cents": amount_cents,
+        "at": dt.datetime.utcnow().isoformat() + "Z",
+        "idempotency_key": order_id,
+    }
+
+def row_from_payload(payload: dict) -> dict:
+    return {
+        "id": payload["payment_id"],
+        "order_id": payload["order_id"],
+        "event": payload["event"],
+        "status": "SUCCESS" if payload["event"] == "payment.succeeded" else "FAILED",
+        "amount_cents": payload["amount_cents"],
+        "created_at": dt.datetime.fromisoformat(payload["at"].rstrip("Z")),
+    }
+
+def _write(session, rows: list[dict]):
+    # Grava os pagamentos e marca as chaves complete na mesma transação. Um
+    # pagamento com chave pending é publicado e gravado de novo na reentrega,
+    # então o id repetido é ignorado em vez de derrubar o lote.
+    dialect_insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(session.get_bind().dialect.name)
+    stmt = dialect_insert(Payment).on_conflict_do_nothing(index_elements=["id"]) if dialect_insert else insert(Payment)
+    session.execute(stmt, rows)
+    complete_keys(session, list({r["order_id"] for r in rows}))
+
+def _row_to_dict(row: dict) -> dict:
+    return {**row, "created_at": row["created_at"].isoformat() + "Z"}
+
+class PaymentRepository:
+    # Escritas do consumer passam por um buffer descarregado em um INSERT
+    # multi-linha por tamanho (batch_size) ou tempo (flush_interval). O
+    # consumer também chama flush() no fim de cada lote, antes do ack.
+    def __init__(self, session_factory=SessionLocal, batch_size: int = PAYMENT_WRITE_BATCH_SIZE,
+                 flush_interval: float = PAYMENT_WRITE_FLUSH_INTERVAL, async_session_factory=None):
+        self.session_factory = session_factory
+        # modo asyncio (asgi.py): asave/aget/alist_by_order; o buffer do
+        # consumer continua sendo descarregado pela thread do writer
+        self.async_session_factory = async_session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._buffer: list[dict] = []
+        self._inflight: list[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._full = threading.Event()
+        self._started = False
+        self.written_total = 0
+        self.flushes_total = 0
+        self.errors_total = 0
+
+    def save(self, payload: dict):
+        with self.session_factory() as s:
+            _write(s, [row_from_payload(payload)])
+            s.commit()
+        self.written_total += 1
+
+    async def asave(self, payload: dict):
+        async with self.async_session_factory() as s:
+            await s.run_sync(_write, [row_from_payload(payload)])
+            await s.commit()
+        self.written_total += 1
+
+    def add(self, payload: dict):
+        with self._lock:
+            self._buffer.append(row_from_payload(payload))
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._full.set()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+                self._inflight = rows
+            if not rows:
+                return 0
+            try:
+                with self.session_factory() as s:
+                    _write(s, rows)
+                    s.commit()
+            except Exception:
+                self.errors_total += 1
+                with self._lock:
+                    self._buffer[:0] = rows
+                raise
+            finally:
+                with self._lock:
+                    self._inflight = []
+            self.written_total += len(rows)
+            self.flushes_total += 1
+            return len(rows)
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+
+        def _run():
+            while True:
+                self._full.wait(self.flush_interval)
+                self._full.clear()
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.warning("flush de pagamentos falhou: %s", e)
+                    time.sleep(1)
+
+        threading.Thread(target=_run, name="payments-writer", daemon=True).start()
+        atexit.register(self._flush_quietly)
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("pagamentos pendentes perdidos no shutdown: %s", e)
+
+    def _pending(self) -> list[dict]:
+        with self._lock:
+            return self._inflight + self._buffer
+
+    def get(self, payment_id: str):
+        # ainda não descarregado: responde sem esperar o próximo flush
+        for row in self._pending():
+            if row["id"] == payment_id:
+                return _row_to_dict(row)
+        with self.session_factory() as s:
+            obj = s.get(Payment, payment_id)
+            return obj.to_dict() if obj else None
+
+    def list_by_order(self, order_id: str) -> list[dict]:
+        pending = [_row_to_dict(r) for r in self._pending() if r["order_id"] == order_id]
+        with self.session_factory() as s:
+            rows = s.execute(
+                select(Payment).where(Payment.order_id == order_id).order_by(Payment.created_at)
+            ).scalars().all()
+            stored = [p.to_dict() for p in rows]
+        seen = {p["id"] for p in stored}
+        return stored + [p for p in pending if p["id"] not in seen]
+
+    async def aget(self, payment_id: str):
+        for row in self._pending():
+            if row["id"] == payment_id:
+                return _row_to_dict(row)
+        async with self.async_session_factory() as s:
+            obj = await s.get(Payment, payment_id)
+            return obj.to_dict() if obj else None
+
+    async def alist_by_order(self, order_id: str) -> list[dict]:
+        pending = [_row_to_dict(r) for r in self._pending() if r["order_id"] == order_id]
+        async with self.async_session_factory() as s:
+            rows = (await s.execute(
+                select(Payment).where(Payment.order_id == order_id).order_by(Payment.created_at)
+            )).scalars().all()
+            stored = [p.to_dict() for p in rows]
+        seen = {p["id"] for p in stored}
+        return stored + [p for p in pending if p["id"] not in seen]
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {"buffered": buffered, "written_total": self.written_total,
+                "flushes_total": self.flushes_total, "errors_total": self.errors_total}
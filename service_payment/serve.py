@@ -0,0 +1,20 @@
+import os, sys
+
+# SERVER_MODE=sync: Flask (app:app) em threads do gunicorn
+# SERVER_MODE=async: Starlette (asgi:app) no worker do uvicorn, com asyncpg e aio-pika
+# Argumentos extras vão direto para o gunicorn (-w, --threads, --reload, ...).
+SERVER_MODE = os.getenv("SERVER_MODE", "sync")
+BIND = os.getenv("BIND", "0.0.0.0:8000")
+
+def main():
+    args = ["gunicorn", "-b", BIND, *sys.argv[1:]]
+    if SERVER_MODE == "async":
+        args += ["-k", "uvicorn.workers.UvicornWorker", "asgi:app"]
+    elif SERVER_MODE == "sync":
+        args += ["app:app"]
+    else:
+        sys.exit(f"SERVER_MODE inválido: {SERVER_MODE!r} (use sync ou async)")
+    os.execvp(args[0], args)
+
+if __name__ == "__main__":
+    main()
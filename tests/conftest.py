@@ -0,0 +1,10 @@
+import os, sys, tempfile
+
+# Os testes importam os módulos do service_order como os próprios serviços
+# fazem (diretório no sys.path), com SQLite e o broker em memória.
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='msdemo-tests-')}/orders.db")
+os.environ.setdefault("RABBITMQ_URL", "memory://tests")
+os.environ.setdefault("TRACE_EXPORT", "")
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+sys.path.insert(0, os.path.join(ROOT, "service_order"))
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+import pika
+import pytest
+
+import admission
+import events
+
+
+class FakeChannel:
+    # só o passive declare que o _queue_depth usa
+    def __init__(self, depths: dict):
+        self.depths = depths
+        self.is_open = True
+        self.declared = []
+
+    def queue_declare(self, queue, passive=False):
+        assert passive
+        self.declared.append(queue)
+        if queue not in self.depths:
+            raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+        return SimpleNamespace(method=SimpleNamespace(message_count=self.depths[queue]))
+
+
+def controller_for(depths: dict) -> admission.AdmissionController:
+    c = admission.AdmissionController(queues=["payments.orders"], enabled=True, max_delay_ms=200)
+    ch = FakeChannel(depths)
+    c._ch = ch
+    c._conn = SimpleNamespace(is_open=True, channel=lambda: ch)
+    return c
+
+
+def sample(c: admission.AdmissionController):
+    c.update(c._queue_depth(), outbox_pending=0, outbox_lag_ms=0)
+    return c.decide()
+
+
+@pytest.fixture
+def partitions(monkeypatch):
+    monkeypatch.setattr(events, "CONSUMER_PARTITIONS", 4)
+
+
+def test_partitioned_depth_is_summed(partitions):
+    # 4 x 2000 = 8000: entre as marcas (5000/20000), mesmo com cada partição abaixo da baixa
+    c = controller_for({f"payments.orders.p{i}": 2000 for i in range(4)})
+
+    decision, seconds = sample(c)
+
+    assert c._ch.declared == [f"payments.orders.p{i}" for i in range(4)]
+    assert c.signals["queue_depth"].value == 8000
+    assert decision == admission.DELAY
+    assert 0 < seconds < 0.2
+
+
+def test_partitioned_depth_above_high_rejects(partitions):
+    c = controller_for({f"payments.orders.p{i}": 6000 for i in range(4)})
+
+    decision, retry_after = sample(c)
+
+    assert decision == admission.REJECT
+    assert 1 <= retry_after <= admission.ADMISSION_RETRY_AFTER_MAX
+
+
+def test_missing_partition_is_reported(partitions, caplog):
+    c = controller_for({f"payments.orders.p{i}": 100 for i in range(3)})
+
+    with caplog.at_level("WARNING", logger=admission.logger.name):
+        decision, _ = sample(c)
+
+    assert decision == admission.ADMIT
+    assert c.missing_queues == {"payments.orders.p3"}
+    assert c.stats()["missing_queues"] == ["payments.orders.p3"]
+    assert "payments.orders.p3" in caplog.text
+
+    c._ch.depths["payments.orders.p3"] = 100
+    sample(c)
+    assert c.missing_queues == set()
+
+
+def test_unpartitioned_queue_is_read_directly(monkeypatch):
+    monkeypatch.setattr(events, "CONSUMER_PARTITIONS", 0)
+    c = controller_for({"payments.orders": 7000})
+
+    decision, _ = sample(c)
+
+    assert c._ch.declared == ["payments.orders"]
+    assert decision == admission.DELAY
@@ -0,0 +1,42 @@
+from cache import MemoryBackend, OrderCache
+
+
+def order(status: str) -> dict:
+    return {"id": "o1", "status": status}
+
+
+def test_invalidation_during_load_skips_write_back():
+    cache = OrderCache(shared=MemoryBackend())
+
+    def loader(order_id):
+        # o consumer grava PAID e invalida enquanto a leitura antiga está em curso
+        cache.invalidate([order_id])
+        return order("PENDING")
+
+    data, _ = cache.get("o1", loader)
+
+    assert data == order("PENDING")
+    assert cache.local.get("o1") is None
+    assert cache.shared.get("order:o1") is None
+    assert cache.stats()["stale_loads"] == 1
+    assert cache.get("o1", lambda oid: order("PAID"))[0] == order("PAID")
+    assert cache.local.get("o1")[0] == order("PAID")
+
+
+def test_generations_only_kept_while_loading():
+    cache = OrderCache()
+    cache.get("o1", lambda oid: order("PENDING"))
+    cache.invalidate(["o1", "o2"])
+
+    assert cache._loading == {} and cache._generations == {}
+
+
+def test_shared_only_invalidation_keeps_local_entry():
+    cache = OrderCache(shared=MemoryBackend())
+    cache.put(order("PENDING"))
+
+    cache.invalidate(["o1"], local=False)
+
+    assert cache.shared.get("order:o1") is None
+    assert cache.local.get("o1")[0] == order("PENDING")
+    assert cache.stats()["invalidations"] == 0
@@ -0,0 +1,53 @@
+import pytest
+
+import codec
+
+EVENT = {"event": "order.created", "order_id": "0190a1b2-0000-7000-8000-000000000001",
+         "customer_name": "João", "amount_cents": 1990, "created_at": "2026-10-01T12:00:00Z"}
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "msgpack"])
+def test_round_trip(name):
+    if name != "json":
+        pytest.importorskip(name)
+    encode, content_type = codec.encoder(name)
+
+    body = encode(EVENT)
+
+    assert isinstance(body, bytes)
+    assert codec.decode(body, content_type, codec.headers()) == EVENT
+
+
+def test_json_and_orjson_share_content_type():
+    pytest.importorskip("orjson")
+    # o consumer não precisa saber qual dos dois o produtor usou
+    assert codec.encoder("json")[1] == codec.encoder("orjson")[1] == codec.JSON
+    assert codec.decode(codec.encoder("json")[0](EVENT), "application/json; charset=utf-8") == EVENT
+
+
+def test_message_without_headers_is_v1_json():
+    assert codec.decode(codec.encoder("json")[0](EVENT)) == EVENT
+
+
+def test_unknown_schema_version_is_rejected():
+    body = codec.encoder("json")[0](EVENT)
+
+    with pytest.raises(ValueError, match="schema v2"):
+        codec.decode(body, codec.JSON, {codec.SCHEMA_VERSION_HEADER: codec.SUPPORTED_SCHEMA_VERSION + 1})
+
+
+@pytest.mark.parametrize("content_type", ["application/xml", "text/plain", "application/octet-stream"])
+def test_unknown_content_type_is_rejected(content_type):
+    with pytest.raises(ValueError, match="content_type não suportado"):
+        codec.decode(b"{}", content_type)
+
+
+def test_unknown_codec_name_is_rejected():
+    with pytest.raises(ValueError, match="EVENT_CODEC inválido"):
+        codec.encoder("protobuf")
+
+
+def test_malformed_msgpack_is_value_error():
+    pytest.importorskip("msgpack")
+    with pytest.raises(ValueError, match="msgpack inválido"):
+        codec.decode(b"\xc1", codec.MSGPACK)
@@ -0,0 +1,117 @@
+import time
+import uuid
+import pytest
+
+from bench_pipeline import Pipeline
+
+
+@pytest.fixture(scope="module")
+def pipeline(tmp_path_factory):
+    # só para carregar os módulos do service_payment com um SQLite próprio
+    with Pipeline(str(tmp_path_factory.mktemp("idempotency")), broker_url="memory://idempotency") as p:
+        yield p
+
+
+@pytest.fixture
+def store(pipeline):
+    return pipeline.payment_modules["idempotency"].IdempotencyStore(cache_ttl=60)
+
+
+def complete(pipeline, key: str):
+    models, idempotency = pipeline.payment_modules["models"], pipeline.payment_modules["idempotency"]
+    with models.SessionLocal() as s:
+        idempotency.complete_keys(s, [key])
+        s.commit()
+
+
+def test_second_claim_while_pending_is_refused(store):
+    key = str(uuid.uuid4())
+    first, second = {"payment_id": "p1"}, {"payment_id": "p2"}
+
+    assert store.get(key) is None
+    assert store.claim(key, first) == (first, False)
+    result, done = store.claim(key, second)
+
+    # a segunda entrega recebe o payload da primeira, não uma reserva nova
+    assert result == first and result is not second
+    assert done is False
+    assert store.get(key) == (first, False)
+
+
+def test_pending_keys_are_not_cached(store):
+    key = str(uuid.uuid4())
+    store.claim(key, {"payment_id": "p1"})
+
+    store.get(key)
+    store.get(key)
+
+    assert store.stats()["db_hits"] == 2
+    assert store.stats()["size"] == 0
+
+
+def test_complete_key_short_circuits_from_cache(pipeline, store):
+    key = str(uuid.uuid4())
+    store.claim(key, {"payment_id": "p1"})
+    complete(pipeline, key)
+
+    assert store.get(key) == ({"payment_id": "p1"}, True)
+    assert store.claim(key, {"payment_id": "p2"}) == ({"payment_id": "p1"}, True)
+    db_hits = store.stats()["db_hits"]
+    assert store.get(key) == ({"payment_id": "p1"}, True)
+    assert store.stats()["db_hits"] == db_hits
+
+
+def test_expired_cache_entry_falls_back_to_db(pipeline):
+    store = pipeline.payment_modules["idempotency"].IdempotencyStore(cache_ttl=0.05)
+    key = str(uuid.uuid4())
+    store.claim(key, {"payment_id": "p1"})
+    complete(pipeline, key)
+    store.get(key)
+
+    time.sleep(0.1)
+
+    assert store.get(key) == ({"payment_id": "p1"}, True)
+    assert store.stats()["db_hits"] == 2
+    assert store.cache.stats()["misses"] == 2
+
+
+def test_lru_evicts_oldest_key(pipeline):
+    cache = pipeline.payment_modules["idempotency"].LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.evictions == 1
+
+
+def test_pay_publishes_once_per_order(pipeline, monkeypatch):
+    payment_app = pipeline.payment_app
+    published = []
+    monkeypatch.setattr(payment_app, "publish_event", lambda routing_key, payload: published.append(payload))
+    order_id = str(uuid.uuid4())
+
+    payload, created = payment_app._pay(order_id, 1990)
+    again, created_again = payment_app._pay(order_id, 1990)
+
+    assert created is True and created_again is False
+    assert again == payload
+    assert published == [payload]
+
+
+def test_pay_republishes_pending_key(pipeline, monkeypatch):
+    # processo caiu entre o claim e a gravação: a reentrega publica o mesmo payload
+    payment_app = pipeline.payment_app
+    published = []
+    monkeypatch.setattr(payment_app, "publish_event", lambda routing_key, payload: published.append(payload))
+    order_id = str(uuid.uuid4())
+    pending = payment_app.new_payment(order_id, 1990)
+    payment_app.idempotency.claim(order_id, pending)
+
+    payload, created = payment_app._pay(order_id, 1990)
+
+    assert created is False
+    assert payload == pending
+    assert published == [pending]
+    assert payment_app.idempotency.get(order_id) == (pending, True)
@@ -0,0 +1,22 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import metrics
+
+
+def test_failed_statement_only_drops_its_own_timer(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/metrics.db")
+    metrics.instrument_engine(engine)
+    before = metrics.DB_QUERY_SECONDS.labels().count
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM tabela_que_nao_existe"))
+        conn.execute(text("SELECT 2"))
+        timers = conn.info["_metrics_t0"]
+
+    assert timers == {}
+    assert metrics.DB_QUERY_SECONDS.labels().count - before == 2
+    engine.dispose()
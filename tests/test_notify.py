@@ -0,0 +1,81 @@
+from collections import namedtuple
+import pytest
+
+import notify
+
+Notify = namedtuple("Notify", "channel payload pid")
+
+
+class FakePsycopg3Connection:
+    # só o que o listener usa da psycopg.Connection: cursor() e notifies()
+    def __init__(self, rounds):
+        self.rounds = list(rounds)
+        self.executed = []
+        self.timeouts = []
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                conn.executed.append(sql)
+
+        return Cursor()
+
+    def notifies(self, timeout=None, stop_after=None):
+        self.timeouts.append(timeout)
+        if not self.rounds:
+            raise ConnectionError("conexão fechada")
+        yield from self.rounds.pop(0)
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    hub = notify.StatusHub()
+    monkeypatch.setattr(notify, "hub", hub)
+    return hub
+
+
+def test_psycopg3_listener_dispatches_notifies(hub):
+    received = []
+    hub.add_listener(received.append)
+    waiter = hub.subscribe("b")
+    conn = FakePsycopg3Connection([
+        [Notify(notify.CHANNEL, "a,b", 1), Notify(notify.CHANNEL, "c", 1)],
+        [],  # timeout sem notificações
+        [Notify(notify.CHANNEL, "d", 2)],
+    ])
+
+    # o erro da conexão sobe para o start_listener, que reconecta
+    with pytest.raises(ConnectionError):
+        notify._listen(conn, "psycopg")
+
+    assert conn.executed == [f"LISTEN {notify.CHANNEL}"]
+    assert received == [["a", "b"], ["c"], ["d"]]
+    assert waiter.is_set()
+    assert all(t for t in conn.timeouts)
+
+
+def test_psycopg3_listener_reassembles_chunked_payloads(hub):
+    # um lote grande vira vários NOTIFY (limite de 8000 bytes por payload)
+    order_ids = [f"0190a1b2-0000-7000-8000-{i:012d}" for i in range(600)]
+    params = notify.pg_notify_params(order_ids)
+    received = []
+    hub.add_listener(received.append)
+    waiters = [hub.subscribe(order_ids[0]), hub.subscribe(order_ids[-1])]
+    conn = FakePsycopg3Connection([[Notify(p["ch"], p["payload"], 1)] for p in params])
+
+    with pytest.raises(ConnectionError):
+        notify._listen(conn, "psycopg")
+
+    assert len(params) > 1
+    assert all(len(p["payload"].encode("utf-8")) < 8000 for p in params)
+    assert len(received) == len(params)
+    assert [oid for chunk in received for oid in chunk] == order_ids
+    assert all(w.is_set() for w in waiters)
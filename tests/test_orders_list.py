@@ -0,0 +1,121 @@
+import base64
+import datetime as dt
+import json
+import string
+import pytest
+
+from bench_pipeline import Pipeline
+
+
+@pytest.fixture(scope="module")
+def pipeline(tmp_path_factory):
+    with Pipeline(str(tmp_path_factory.mktemp("orders-list")), broker_url="memory://orders-list") as p:
+        yield p
+
+
+def add_orders(p, customer: str, created_at: list) -> list[str]:
+    models, orders = p.order_modules["models"], p.order_modules["orders"]
+    rows = [models.Order(id=orders.new_order_id(t), customer_name=customer, item="Livro", amount_cents=1990,
+                         status="PENDING", created_at=t) for t in created_at]
+    ids = [o.id for o in rows]
+    with models.SessionLocal() as s:
+        s.add_all(rows)
+        s.commit()
+    return ids
+
+
+def list_all(p, customer: str, limit: int) -> tuple[list, int]:
+    ids, pages, cursor = [], 0, None
+    while True:
+        params = {"customer_name": customer, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        r = p.client.get("/orders", query_string=params)
+        assert r.status_code == 200
+        ids += [o["id"] for o in r.json]
+        pages += 1
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids, pages
+
+
+def test_cursor_encodes_created_at_and_id(pipeline):
+    orders, models = pipeline.order_modules["orders"], pipeline.order_modules["models"]
+    created_at = dt.datetime(2026, 10, 1, 12, 30, 0, 123456)
+    order = models.Order(id=orders.new_order_id(created_at), created_at=created_at)
+
+    cursor = orders.encode_cursor(order)
+
+    # vai na query string sem escape
+    assert set(cursor) <= set(string.ascii_letters + string.digits + "-_=")
+    assert orders.decode_cursor(cursor) == (created_at, order.id)
+
+
+def test_pages_break_ties_on_id(pipeline):
+    now = dt.datetime.utcnow().replace(microsecond=0)
+    same = [now - dt.timedelta(minutes=5)] * 5
+    ids = add_orders(pipeline, "Cursor Empate", [now] + same + [now - dt.timedelta(minutes=10)])
+    # created_at desc, e id desc entre os cinco com o mesmo created_at
+    expected = [ids[0]] + sorted(ids[1:6], reverse=True) + [ids[6]]
+
+    listed, pages = list_all(pipeline, "Cursor Empate", limit=2)
+
+    assert listed == expected
+    assert pages == 4
+
+
+@pytest.mark.parametrize("cursor", [
+    "não-é-base64",
+    base64.urlsafe_b64encode(b"sem separador").decode("ascii"),
+    base64.urlsafe_b64encode(b"ontem|0190a1b2-0000-7000-8000-000000000000").decode("ascii"),
+])
+def test_invalid_cursor_is_400(pipeline, cursor):
+    r = pipeline.client.get("/orders", query_string={"cursor": cursor})
+
+    assert r.status_code == 400
+    assert "cursor inválido" in r.get_data(as_text=True)
+
+
+def export_ids(p, customer: str) -> list[str]:
+    r = p.client.get("/orders", query_string={"customer_name": customer, "format": "ndjson"})
+    assert r.status_code == 200
+    return [json.loads(line)["id"] for line in r.get_data(as_text=True).splitlines()]
+
+
+@pytest.fixture
+def partitioned(pipeline, monkeypatch):
+    # o SQLite nunca é particionado; simula o Postgres com ORDERS_PARTITIONING
+    monkeypatch.setattr(pipeline.order_modules["partitioning"], "orders_partitioned", lambda *a, **kw: True)
+
+
+def test_list_without_partitions_has_no_default_window(pipeline):
+    now = dt.datetime.utcnow()
+    ids = add_orders(pipeline, "Sem Janela", [now, now - dt.timedelta(days=90)])
+
+    r = pipeline.client.get("/orders", query_string={"customer_name": "Sem Janela"})
+
+    assert [o["id"] for o in r.json] == ids
+    assert "X-Created-From" not in r.headers
+
+
+def test_partitioned_list_applies_and_echoes_default_window(pipeline, partitioned):
+    now = dt.datetime.utcnow()
+    ids = add_orders(pipeline, "Janela", [now, now - dt.timedelta(days=90)])
+
+    r = pipeline.client.get("/orders", query_string={"customer_name": "Janela"})
+
+    assert [o["id"] for o in r.json] == ids[:1]
+    cutoff = dt.datetime.fromisoformat(r.headers["X-Created-From"].rstrip("Z"))
+    days = pipeline.order_modules["orders"].ORDER_LIST_DEFAULT_DAYS
+    assert abs(cutoff - (now - dt.timedelta(days=days))) < dt.timedelta(minutes=1)
+
+    r = pipeline.client.get("/orders", query_string={"customer_name": "Janela", "created_from": "2000-01-01T00:00:00Z"})
+    assert [o["id"] for o in r.json] == ids
+    assert "X-Created-From" not in r.headers
+
+
+def test_export_returns_orders_older_than_the_window(pipeline, partitioned):
+    now = dt.datetime.utcnow()
+    ids = add_orders(pipeline, "Export", [now, now - dt.timedelta(days=45), now - dt.timedelta(days=400)])
+
+    assert export_ids(pipeline, "Export") == ids
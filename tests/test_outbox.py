@@ -0,0 +1,78 @@
+import datetime as dt
+import pytest
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import sessionmaker
+
+import outbox
+from models import Base, OutboxEvent
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/outbox.db")
+    Base.metadata.create_all(engine, tables=[OutboxEvent.__table__])
+    yield sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    engine.dispose()
+
+
+def add_events(session_factory, n: int, age: dt.timedelta = dt.timedelta(0)) -> list[str]:
+    created_at = dt.datetime.utcnow() - age
+    order_ids = [f"order-{i}" for i in range(n)]
+    with session_factory() as s:
+        s.add_all([OutboxEvent(routing_key="order.created", payload={"order_id": oid},
+                               headers={"traceparent": f"tp-{oid}"}, created_at=created_at)
+                   for oid in order_ids])
+        s.commit()
+    return order_ids
+
+
+def pending(session_factory) -> int:
+    with session_factory() as s:
+        return s.execute(select(func.count(OutboxEvent.id))).scalar_one()
+
+
+def test_drain_publishes_in_batches_and_deletes(session_factory):
+    order_ids = add_events(session_factory, 5)
+    batches = []
+
+    drained = [outbox.drain_once(session_factory, batches.append, batch_size=2) for _ in range(4)]
+
+    assert drained == [2, 2, 1, 0]
+    assert [len(b) for b in batches] == [2, 2, 1]
+    published = [item for b in batches for item in b]
+    assert [p[1]["order_id"] for p in published] == order_ids
+    assert published[0] == ("order.created", {"order_id": "order-0"}, {"traceparent": "tp-order-0"})
+    assert pending(session_factory) == 0
+
+
+def test_rows_kept_when_publish_fails(session_factory):
+    add_events(session_factory, 3)
+
+    def broken(items):
+        raise ConnectionError("broker fora")
+
+    with pytest.raises(ConnectionError):
+        outbox.drain_once(session_factory, broken, batch_size=10)
+    assert pending(session_factory) == 3
+
+    batches = []
+    assert outbox.drain_once(session_factory, batches.append, batch_size=10) == 3
+    assert len(batches[0]) == 3
+    assert pending(session_factory) == 0
+
+
+def test_lag_stats(session_factory):
+    add_events(session_factory, 2, age=dt.timedelta(seconds=5))
+    before = outbox.stats(session_factory)
+    assert before["pending"] == 2
+    assert before["oldest_pending_age_ms"] >= 5000
+
+    outbox.drain_once(session_factory, lambda items: None, batch_size=10)
+
+    after = outbox.stats(session_factory)
+    assert after["pending"] == 0
+    assert after["oldest_pending_age_ms"] == 0.0
+    assert after["published_total"] - before["published_total"] == 2
+    assert after["batches_total"] - before["batches_total"] == 1
+    assert after["last_batch_size"] == 2
+    assert 5000 <= after["last_lag_ms"] < 60000
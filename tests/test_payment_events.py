@@ -0,0 +1,109 @@
+import datetime as dt
+import time
+import pytest
+from sqlalchemy import select
+
+from bench_pipeline import Pipeline
+
+
+@pytest.fixture(scope="module")
+def pipeline(tmp_path_factory):
+    with Pipeline(str(tmp_path_factory.mktemp("payment-events")), broker_url="memory://payment-events") as p:
+        yield p
+
+
+def add_order(p) -> str:
+    # direto no banco, sem outbox: só os eventos publicados pelo teste mexem no status
+    models, orders = p.order_modules["models"], p.order_modules["orders"]
+    created_at = dt.datetime.utcnow()
+    order_id = orders.new_order_id(created_at)
+    with models.SessionLocal() as s:
+        s.add(models.Order(id=order_id, customer_name="Eventos", item="Livro", amount_cents=1990,
+                           status="PENDING", created_at=created_at))
+        s.commit()
+    return order_id
+
+
+def statuses(p, order_ids) -> dict:
+    models = p.order_modules["models"]
+    with models.SessionLocal() as s:
+        rows = s.execute(select(models.Order.id, models.Order.status).where(models.Order.id.in_(order_ids)))
+        return dict(rows.all())
+
+
+def wait_status(p, order_ids, done, timeout: float = 10) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        current = statuses(p, order_ids)
+        if all(done(current.get(oid)) for oid in order_ids) or time.monotonic() > deadline:
+            return current
+        time.sleep(0.02)
+
+
+def deliver(p, events: list[tuple[str, str]]):
+    # publica pelo service_payment e espera um pedido sentinela publicado por
+    # último: fila única com um consumer, então os anteriores já foram aplicados
+    sentinel = add_order(p)
+    messages = [(event, {"event": event, "order_id": oid}) for event, oid in events]
+    p.payment_modules["events"].publish_events(messages + [("payment.succeeded",
+                                                            {"event": "payment.succeeded", "order_id": sentinel})])
+    assert wait_status(p, [sentinel], lambda s: s == "PAID")[sentinel] == "PAID"
+
+
+def test_failed_after_succeeded_keeps_paid(pipeline):
+    order_id = add_order(pipeline)
+
+    deliver(pipeline, [("payment.succeeded", order_id)])
+    deliver(pipeline, [("payment.failed", order_id)])
+
+    assert statuses(pipeline, [order_id]) == {order_id: "PAID"}
+
+
+@pytest.mark.parametrize("events", [
+    ["payment.succeeded", "payment.failed"],
+    ["payment.failed", "payment.succeeded"],
+])
+def test_succeeded_wins_in_the_same_batch(pipeline, events):
+    order_id = add_order(pipeline)
+
+    deliver(pipeline, [(event, order_id) for event in events])
+
+    assert statuses(pipeline, [order_id]) == {order_id: "PAID"}
+
+
+def test_duplicate_events_are_idempotent(pipeline):
+    paid, cancelled = add_order(pipeline), add_order(pipeline)
+
+    deliver(pipeline, [("payment.succeeded", paid)] * 3 + [("payment.failed", cancelled)] * 3)
+    deliver(pipeline, [("payment.succeeded", paid), ("payment.failed", cancelled)])
+
+    assert statuses(pipeline, [paid, cancelled]) == {paid: "PAID", cancelled: "CANCELLED"}
+
+
+def test_batch_with_invalid_items_is_207(pipeline):
+    items = [
+        {"customer_name": "Lote", "item": "Livro", "amount_cents": 1990},
+        {"customer_name": "Lote", "item": "", "amount_cents": 1990},
+        {"customer_name": "Lote", "item": "Caneta", "amount_cents": 0},
+        {"customer_name": "Lote", "item": "Caderno", "amount_cents": 4990},
+    ]
+
+    r = pipeline.client.post("/orders:batch", json=items)
+
+    assert r.status_code == 207
+    assert (r.json["created"], r.json["failed"]) == (2, 2)
+    assert [res["status"] for res in r.json["results"]] == [201, 400, 400, 201]
+    assert [res["index"] for res in r.json["results"]] == [0, 1, 2, 3]
+    created = [res["order"]["id"] for res in r.json["results"] if res["status"] == 201]
+    # os válidos seguem o fluxo normal até o pagamento
+    final = wait_status(pipeline, created, lambda s: s in ("PAID", "CANCELLED"))
+    assert set(final) == set(created)
+    assert all(s in ("PAID", "CANCELLED") for s in final.values())
+
+
+def test_batch_with_only_invalid_items_is_400(pipeline):
+    r = pipeline.client.post("/orders:batch", json=[{"customer_name": "Lote"}, "não é objeto"])
+
+    assert r.status_code == 400
+    assert r.json["created"] == 0
+    assert [res["status"] for res in r.json["results"]] == [400, 400]
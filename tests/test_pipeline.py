@@ -0,0 +1,26 @@
+import os
+import pytest
+
+from bench_pipeline import Pipeline
+
+# Fluxo order -> payment -> order inteiro (broker em memória + SQLite) sob o
+# pytest-benchmark. Para comparar com um run anterior no CI:
+#   python -m pytest tests/test_pipeline.py --benchmark-autosave
+#   python -m pytest tests/test_pipeline.py --benchmark-compare --benchmark-compare-fail=mean:25%
+PIPELINE_ORDERS = int(os.getenv("PIPELINE_ORDERS", "200"))
+PIPELINE_MIN_THROUGHPUT = float(os.getenv("PIPELINE_MIN_THROUGHPUT", "20"))
+
+
+@pytest.fixture(scope="module")
+def pipeline(tmp_path_factory):
+    with Pipeline(str(tmp_path_factory.mktemp("pipeline"))) as p:
+        yield p
+
+
+def test_pipeline_throughput(benchmark, pipeline):
+    result = benchmark.pedantic(pipeline.run, args=(PIPELINE_ORDERS,), rounds=3, iterations=1)
+    benchmark.extra_info.update(result)
+
+    assert result["lost"] == 0
+    assert result["completed"] == PIPELINE_ORDERS
+    assert result["e2e_rps"] >= PIPELINE_MIN_THROUGHPUT
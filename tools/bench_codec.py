@@ -0,0 +1,52 @@
+import argparse, os, sys, time, uuid
+import datetime as dt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "service_order"))
+
+import codec
+
+
+def payloads() -> dict:
+    order_id = str(uuid.uuid4())
+    now = dt.datetime.utcnow().isoformat() + "Z"
+    return {
+        "order.created": {"event": "order.created", "order_id": order_id, "customer_name": "Vitor-ab12cd",
+                          "item": "Arquitetura de Microsserviços", "amount_cents": 4990, "created_at": now},
+        "payment.succeeded": {"event": "payment.succeeded", "order_id": order_id, "payment_id": str(uuid.uuid4()),
+                              "amount_cents": 4990, "at": now, "idempotency_key": order_id},
+    }
+
+
+def bench(fn, arg, n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn(arg)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Custo de encode/decode dos eventos por codec (EVENT_CODEC)")
+    ap.add_argument("--n", type=int, default=200000, help="Repetições por medição")
+    ap.add_argument("--codecs", default="json,orjson,msgpack")
+    args = ap.parse_args()
+
+    print(f"{'evento':<18} {'codec':<8} {'bytes':>6} {'encode µs':>10} {'decode µs':>10} {'total µs':>9}")
+    for event, payload in payloads().items():
+        for name in args.codecs.split(","):
+            if (name == "orjson" and codec.orjson is None) or (name == "msgpack" and codec.msgpack is None):
+                print(f"{event:<18} {name:<8} (pacote não instalado)")
+                continue
+            encode, content_type = codec.encoder(name)
+            if name == "json":
+                decode = codec._json_loads
+            else:
+                decode = codec._decoders[content_type]
+            body = encode(payload)
+            assert decode(body) == payload
+            enc = bench(encode, payload, args.n)
+            dec = bench(decode, body, args.n)
+            print(f"{event:<18} {name:<8} {len(body):>6} {enc:>10.3f} {dec:>10.3f} {enc + dec:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
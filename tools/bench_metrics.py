@@ -0,0 +1,40 @@
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "service_order"))
+
+
+def bench(name: str, fn, n: int):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    us = (time.perf_counter() - t0) / n * 1e6
+    print(f"{name:<34}: {us:.3f} µs/op")
+    return us
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Mede o custo por evento da instrumentação de metrics.py")
+    ap.add_argument("--n", type=int, default=500_000)
+    args = ap.parse_args()
+
+    from metrics import Counter, Histogram
+
+    hist = Histogram("bench_seconds", "bench", ("queue",))
+    counter = Counter("bench_total", "bench", ("outcome",))
+    child = hist.labels("orders.payments")
+
+    base = bench("loop vazio", lambda: None, args.n)
+    bench("histogram.observe (child)", lambda: child.observe(0.0031), args.n)
+    bench("histogram.labels().observe", lambda: hist.labels("orders.payments").observe(0.0031), args.n)
+    bench("counter.labels().inc", lambda: counter.labels("acked").inc(), args.n)
+
+    def timed():
+        with child.time():
+            pass
+
+    bench("histogram.time() (2x perf_counter)", timed, args.n)
+    print(f"(descontar ~{base:.3f} µs do loop vazio)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import argparse, os, sys, time, random
+import datetime as dt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "service_order"))
+
+
+def pct(values, p):
+    k = max(0, min(len(values) - 1, int(round((p / 100) * len(values))) - 1))
+    return values[k]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="p50/p99 de GET /orders/<id> sem cache vs. com o cache read-through")
+    ap.add_argument("--database-url", default="sqlite:///bench_orders.db")
+    ap.add_argument("--orders", type=int, default=2000, help="Pedidos semeados")
+    ap.add_argument("--hot", type=int, default=200, help="Pedidos do conjunto quente (80%% das leituras)")
+    ap.add_argument("--requests", type=int, default=20000)
+    args = ap.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    from models import Order, SessionLocal, init_db
+    from cache import OrderCache
+    from orders import new_order_id
+    import app as order_app
+
+    init_db()
+    now = dt.datetime.utcnow()
+    ids = [new_order_id(now) for _ in range(args.orders)]
+    with SessionLocal() as s:
+        s.add_all([Order(id=i, customer_name="Bench", item="SQL Performance", amount_cents=1990,
+                         status="PENDING", created_at=now) for i in ids])
+        s.commit()
+    hot = ids[:args.hot]
+    reads = [random.choice(hot) if random.random() < 0.8 else random.choice(ids) for _ in range(args.requests)]
+    client = order_app.app.test_client()
+
+    def run(name: str, cache: OrderCache):
+        order_app.order_cache = cache
+        lat = []
+        for oid in reads:
+            t0 = time.perf_counter()
+            client.get(f"/orders/{oid}")
+            lat.append((time.perf_counter() - t0) * 1000)
+        lat.sort()
+        st = cache.stats()
+        print(f"{name:<10}: p50={pct(lat, 50):.3f} ms  p99={pct(lat, 99):.3f} ms  hit_ratio={st['hit_ratio']:.2f}")
+
+    run("sem cache", OrderCache(size=0))
+    run("com cache", OrderCache())
+
+
+if __name__ == "__main__":
+    main()
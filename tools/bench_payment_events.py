@@ -0,0 +1,56 @@
+import argparse, os, sys, time, random
+import datetime as dt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "service_order"))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Mede msgs/s de _on_payment_event (1 commit por evento) vs. _on_payment_events (lote)")
+    ap.add_argument("--database-url", default="sqlite:///bench_orders.db")
+    ap.add_argument("--total", type=int, default=5000)
+    ap.add_argument("--batch-size", type=int, default=100)
+    ap.add_argument("--fail-rate", type=float, default=0.1)
+    args = ap.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    from sqlalchemy import update
+    from models import Order, SessionLocal, init_db
+    from orders import new_order_id
+    import app as order_app
+
+    init_db()
+    now = dt.datetime.utcnow()
+    ids = [new_order_id(now) for _ in range(args.total)]
+    with SessionLocal() as s:
+        s.add_all([Order(id=i, customer_name="Bench", item="SQL Performance", amount_cents=1990,
+                         status="PENDING", created_at=now) for i in ids])
+        s.commit()
+
+    messages = [
+        {"event": "payment.failed" if random.random() < args.fail_rate else "payment.succeeded", "order_id": i}
+        for i in ids
+    ]
+
+    def reset():
+        with SessionLocal() as s:
+            s.execute(update(Order).where(Order.id.in_(ids)).values(status="PENDING"))
+            s.commit()
+
+    t0 = time.perf_counter()
+    for m in messages:
+        order_app._on_payment_event(m)
+    single = args.total / (time.perf_counter() - t0)
+
+    reset()
+    t0 = time.perf_counter()
+    for k in range(0, len(messages), args.batch_size):
+        order_app._on_payment_events(messages[k:k + args.batch_size])
+    batched = args.total / (time.perf_counter() - t0)
+
+    print(f"Por mensagem         : {single:,.0f} msgs/s")
+    print(f"Lote de {args.batch_size:<13}: {batched:,.0f} msgs/s")
+    print(f"Speedup              : {batched / single:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import argparse, importlib, os, random, sys, tempfile, threading, time
+
+# Roda order -> RabbitMQ -> payment -> order inteiro num processo só, sem
+# docker-compose: RABBITMQ_URL=memory:// (membroker.py) e um SQLite por
+# serviço. Os dois serviços têm módulos com o mesmo nome (app, events,
+# models...), então cada um é importado com o seu diretório no sys.path e os
+# módulos são trocados entre um import e outro; só o membroker fica
+# compartilhado, para os dois falarem com o mesmo broker.
+#
+#   python tools/bench_pipeline.py --orders 2000 --min-throughput 150
+#
+# No CI o mesmo Pipeline roda sob o pytest-benchmark em tests/test_pipeline.py.
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SHARED_MODULES = ("membroker",)
+
+
+def _service_modules(service_dir: str) -> dict:
+    service_dir = os.path.abspath(service_dir)
+    return {name: mod for name, mod in list(sys.modules.items())
+            if name not in SHARED_MODULES
+            and os.path.dirname(os.path.abspath(getattr(mod, "__file__", None) or "/")) == service_dir}
+
+
+def _load_service(name: str, database_url: str, env: dict):
+    service_dir = os.path.abspath(os.path.join(ROOT, f"service_{name}"))
+    for mod in _service_modules(os.path.join(ROOT, "service_order")) | _service_modules(os.path.join(ROOT, "service_payment")):
+        sys.modules.pop(mod, None)
+    os.environ.update(env, DATABASE_URL=database_url)
+    sys.path.insert(0, service_dir)
+    try:
+        importlib.import_module("models").init_db()
+        app = importlib.import_module("app")
+        return app, _service_modules(service_dir)
+    finally:
+        sys.path.remove(service_dir)
+
+
+class Pipeline:
+    def __init__(self, workdir: str = None, broker_url: str = "memory://bench", env: dict = None, partitions: int = 0):
+        self.workdir = workdir or tempfile.mkdtemp(prefix="msdemo-bench-")
+        self.broker_url = broker_url
+        self.partitions = partitions
+        self.env = {"RABBITMQ_URL": broker_url, "ORDER_STATUS_NOTIFY": "local", "WEB_CONSUMERS": "false",
+                    # sem SKIP LOCKED no SQLite, dois relays publicariam as mesmas linhas
+                    "OUTBOX_RELAY_WORKERS": "1", "TRACE_EXPORT": "",
+                    "CONSUMER_PARTITIONS": str(partitions), "CONSUMER_HEARTBEAT_INTERVAL": "0.5", **(env or {})}
+        self._done: dict[str, float] = {}
+        self._done_cond = threading.Condition()
+
+    def start(self, timeout: float = 10):
+        self.order_app, self.order_modules = _load_service(
+            "order", f"sqlite:///{self.workdir}/orders.db", self.env)
+        self.payment_app, self.payment_modules = _load_service(
+            "payment", f"sqlite:///{self.workdir}/payments.db", self.env)
+        self.order_modules["notify"].hub.add_listener(self._on_status)
+        self.client = self.order_app.app.test_client()
+
+        self.payment_app.start_consumers()
+        self.order_app.start_consumers()
+        # o order.created só é roteado depois que o payment declarou a fila
+        broker = self.order_modules["events"].membroker.get_broker(self.broker_url)
+        queues = ("payments.orders", "orders.payments")
+        if self.partitions:
+            queues = [f"{q}.p{i}" for q in queues for i in range(self.partitions)]
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            stats = broker.stats()
+            if all(stats.get(q, {}).get("consumers") for q in queues):
+                return self
+            time.sleep(0.01)
+        raise RuntimeError("consumers não subiram no broker em memória")
+
+    def stop(self):
+        for modules in (self.payment_modules, self.order_modules):
+            modules["events"].stop_consumers(timeout=5)
+        self.payment_app.payments.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _on_status(self, order_ids):
+        now = time.perf_counter()
+        with self._done_cond:
+            for oid in order_ids:
+                self._done.setdefault(oid, now)
+            self._done_cond.notify_all()
+
+    def create_order(self, amount_cents: int) -> str:
+        r = self.client.post("/orders", json={"customer_name": "Bench", "item": "SQL Performance",
+                                               "amount_cents": amount_cents})
+        if r.status_code != 201:
+            raise RuntimeError(f"POST /orders devolveu {r.status_code}")
+        return r.json["id"]
+
+    def run(self, orders: int, timeout: float = 30) -> dict:
+        created = {}
+        t0 = time.perf_counter()
+        for _ in range(orders):
+            created[self.create_order(random.choice([1990, 4990, 9900, 12900]))] = time.perf_counter()
+        t_created = time.perf_counter()
+
+        deadline = time.monotonic() + timeout
+        with self._done_cond:
+            while any(oid not in self._done for oid in created) and time.monotonic() < deadline:
+                self._done_cond.wait(0.05)
+            done = {oid: self._done[oid] for oid in created if oid in self._done}
+        elapsed = (max(done.values()) if done else time.perf_counter()) - t0
+        e2e = sorted((done[oid] - t) * 1000 for oid, t in created.items() if oid in done)
+
+        def pct(p):
+            return e2e[max(0, min(len(e2e) - 1, int(round(p / 100 * len(e2e))) - 1))] if e2e else None
+
+        return {"orders": orders, "completed": len(done), "lost": orders - len(done),
+                "create_rps": orders / (t_created - t0), "e2e_rps": len(done) / elapsed if elapsed else 0,
+                "e2e_p50_ms": pct(50), "e2e_p99_ms": pct(99)}
+
+
+def micro(p: Pipeline, n: int) -> dict:
+    # custo por chamada de cada etapa, direto na função (sem fila no meio)
+    ids = [p.create_order(1990) for _ in range(n)]
+    order_app, payment_app = p.order_app, p.payment_app
+    cases = {
+        "create_order (POST /orders)": lambda i: p.create_order(1990),
+        "_on_order_created": lambda i: payment_app._on_order_created(
+            {"event": "order.created", "order_id": f"micro-{i}-{random.random()}", "amount_cents": 1990}),
+        "_pay (chave repetida)": lambda i: payment_app._pay(ids[i], 1990),
+        "_on_payment_event": lambda i: order_app._on_payment_event({"event": "payment.succeeded", "order_id": ids[i]}),
+    }
+    out = {}
+    for name, fn in cases.items():
+        t0 = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        out[name] = (time.perf_counter() - t0) / n * 1e6
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fluxo order -> payment -> order num processo só (broker em memória + SQLite)")
+    ap.add_argument("--orders", type=int, default=1000, help="Pedidos criados no fluxo completo")
+    ap.add_argument("--timeout", type=float, default=60, help="Tempo máximo (s) esperando os pedidos finalizarem")
+    ap.add_argument("--micro", type=int, default=200, help="Chamadas por função no micro-benchmark (0 desliga)")
+    ap.add_argument("--min-throughput", type=float, help="Sai com código 1 se o e2e ficar abaixo disso (pedidos/s)")
+    ap.add_argument("--workdir", help="Diretório dos bancos SQLite (padrão: temporário)")
+    ap.add_argument("--partitions", type=int, default=0, help="CONSUMER_PARTITIONS dos dois serviços (0 = fila única)")
+    args = ap.parse_args()
+
+    with Pipeline(args.workdir, partitions=args.partitions) as p:
+        r = p.run(args.orders, args.timeout)
+        print(f"pedidos={r['orders']} finalizados={r['completed']} perdidos={r['lost']}")
+        print(f"criação={r['create_rps']:.0f} pedidos/s  fluxo completo={r['e2e_rps']:.0f} pedidos/s  "
+              f"e2e p50={r['e2e_p50_ms'] or 0:.1f} ms p99={r['e2e_p99_ms'] or 0:.1f} ms")
+        if args.micro:
+            for name, us in micro(p, args.micro).items():
+                print(f"{name:<30} {us:9.1f} µs/chamada")
+
+    if r["lost"] or (args.min_throughput and r["e2e_rps"] < args.min_throughput):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import argparse, asyncio, json, math, platform, random, sys, time
+import datetime as dt
+import httpx
+from load_test import create_order_and_wait
+
+# Benchmark open-loop: os pedidos saem num ritmo fixo (--rps), independente de
+# quanto o serviço demora para responder. A latência é medida a partir do
+# horário *planejado* de cada chegada, então um serviço lento não reduz a carga
+# nem esconde a fila (coordinated omission do load_test.py, que é closed-loop).
+#
+#   python tools/bench_suite.py run --rps 200 --duration 60 --out base.json
+#   python tools/bench_suite.py run --profile ramp --rps 50 --rps-end 500 --duration 120 --out ramp.json
+#   python tools/bench_suite.py compare base.json novo.json
+
+STAGES = ("create", "settle", "e2e", "e2e_paid", "e2e_cancelled")
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class Histogram:
+    # Histograma no estilo HDR: valores em µs agrupados com `digits` dígitos
+    # significativos (erro relativo < 0,1% com 3). Memória proporcional ao
+    # intervalo de valores, não ao número de amostras, e mesclável entre runs.
+    def __init__(self, digits: int = 3, counts: dict | None = None):
+        self.digits = digits
+        self.counts: dict[int, int] = {int(k): v for k, v in (counts or {}).items()}
+
+    def _bucket(self, us: int) -> int:
+        unit = 10 ** max(0, len(str(us)) - self.digits)
+        return us // unit * unit
+
+    def record(self, ms: float):
+        us = max(1, int(ms * 1000))
+        b = self._bucket(us)
+        self.counts[b] = self.counts.get(b, 0) + 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def percentile(self, p: float) -> float | None:
+        total = self.total
+        if not total:
+            return None
+        rank = max(1, math.ceil(p / 100 * total))
+        seen = 0
+        for b in sorted(self.counts):
+            seen += self.counts[b]
+            if seen >= rank:
+                return b / 1000
+        return max(self.counts) / 1000
+
+    def summary(self) -> dict:
+        if not self.counts:
+            return {"count": 0}
+        total = self.total
+        out = {"count": total,
+               "min": min(self.counts) / 1000,
+               "mean": sum(b * c for b, c in self.counts.items()) / total / 1000,
+               "max": max(self.counts) / 1000}
+        for p in PERCENTILES:
+            out[f"p{p:g}"] = self.percentile(p)
+        return out
+
+    def to_json(self) -> dict:
+        return {"unit": "us", "digits": self.digits, "counts": {str(k): v for k, v in sorted(self.counts.items())}}
+
+
+def schedule(args) -> list[float]:
+    # offsets (s) das chegadas a partir do início do run
+    def rate(t: float) -> float:
+        if args.profile == "ramp":
+            return args.rps + (args.rps_end - args.rps) * t / args.duration
+        if args.profile == "step":
+            return args.rps + args.step_rps * int(t // args.step_every)
+        return args.rps
+
+    out, t = [], 0.0
+    while t < args.duration:
+        r = max(rate(t), 0.1)
+        gap = random.expovariate(r) if args.arrivals == "poisson" else 1 / r
+        out.append(t)
+        t += gap
+    return out
+
+
+async def run(args):
+    offsets = schedule(args)
+    hists = {s: Histogram(args.digits) for s in STAGES}
+    windows: dict[int, dict] = {}
+    counts = {"planned": len(offsets), "sent": 0, "created": 0, "completed": 0,
+              "timeouts": 0, "errors": 0, "skipped": 0, "max_lag_ms": 0.0}
+    inflight = 0
+    tasks = set()
+
+    def window(offset: float) -> dict:
+        return windows.setdefault(int(offset // args.window),
+                                  {"sent": 0, "completed": 0, "errors": 0, "e2e": Histogram(args.digits)})
+
+    async def one(offset: float, t_sched: float):
+        nonlocal inflight
+        # atraso entre o horário planejado e o envio entra na latência
+        lag_ms = (time.perf_counter() - t_sched) * 1000
+        counts["max_lag_ms"] = max(counts["max_lag_ms"], lag_ms)
+        try:
+            res = await create_order_and_wait(0, args.order_base_url, args.fail_rate, args.timeout_sec, client,
+                                              mode=args.mode, wait_sec=args.wait_sec)
+        finally:
+            inflight -= 1
+        w = window(offset)
+        if res.create_code != 201:
+            counts["errors"] += 1
+            w["errors"] += 1
+            return
+        counts["created"] += 1
+        hists["create"].record(lag_ms + res.t_create_ms)
+        if res.t_e2e_ms is None:
+            counts["timeouts"] += 1
+            w["errors"] += 1
+            return
+        counts["completed"] += 1
+        w["completed"] += 1
+        e2e = lag_ms + res.t_e2e_ms
+        hists["settle"].record(res.t_e2e_ms - res.t_create_ms)
+        hists["e2e"].record(e2e)
+        hists["e2e_paid" if res.expected == "PAID" else "e2e_cancelled"].record(e2e)
+        w["e2e"].record(e2e)
+
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    async with httpx.AsyncClient(limits=limits) as client:
+        print(f"[bench] {args.profile} {len(offsets)} pedidos em {args.duration:.0f}s "
+              f"({len(offsets) / args.duration:.1f} req/s médio, chegadas {args.arrivals})")
+        t_start = time.perf_counter()
+        for offset in offsets:
+            t_sched = t_start + offset
+            delay = t_sched - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            window(offset)["sent"] += 1
+            if inflight >= args.max_inflight:
+                # o cliente não acompanha: conta como erro em vez de atrasar as próximas
+                counts["skipped"] += 1
+                window(offset)["errors"] += 1
+                continue
+            inflight += 1
+            counts["sent"] += 1
+            task = asyncio.create_task(one(offset, t_sched))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - t_start
+
+    return {
+        "meta": {"started_at": dt.datetime.utcnow().isoformat() + "Z", "python": platform.python_version(),
+                 "args": {k: v for k, v in vars(args).items() if k not in ("cmd", "func")}},
+        "elapsed_s": elapsed,
+        "counts": counts,
+        "throughput": {"offered_rps": len(offsets) / args.duration,
+                       "create_rps": counts["created"] / elapsed,
+                       "completed_rps": counts["completed"] / elapsed},
+        "stages": {s: h.summary() for s, h in hists.items()},
+        "timeline": [{"t": k * args.window, "sent": w["sent"], "completed": w["completed"], "errors": w["errors"],
+                      "e2e_p99": w["e2e"].percentile(99)} for k, w in sorted(windows.items())],
+        "histograms": {s: h.to_json() for s, h in hists.items()},
+    }
+
+
+def fmt(v) -> str:
+    return "-" if v is None else f"{v:.1f}"
+
+
+def print_report(r: dict):
+    c, t = r["counts"], r["throughput"]
+    print("\n==== BENCH =======================================================")
+    print(f"Pedidos              : planejados={c['planned']} enviados={c['sent']} criados={c['created']} "
+          f"finalizados={c['completed']}")
+    print(f"Falhas               : erros={c['errors']} timeouts={c['timeouts']} descartados={c['skipped']} "
+          f"(atraso máx. do gerador {c['max_lag_ms']:.1f} ms)")
+    print(f"Throughput (req/s)   : oferecido={t['offered_rps']:.1f} criados={t['create_rps']:.1f} "
+          f"finalizados={t['completed_rps']:.1f}")
+    print(f"\n{'etapa (ms)':<14} {'n':>7} " + " ".join(f"{'p' + format(p, 'g'):>8}" for p in PERCENTILES) + f" {'max':>8}")
+    for stage, s in r["stages"].items():
+        if not s.get("count"):
+            continue
+        print(f"{stage:<14} {s['count']:>7} " + " ".join(f"{fmt(s[f'p{p:g}']):>8}" for p in PERCENTILES)
+              + f" {fmt(s['max']):>8}")
+    print("==================================================================\n")
+
+
+def cmd_run(args):
+    if args.profile == "ramp" and args.rps_end is None:
+        sys.exit("--profile ramp requer --rps-end")
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"[bench] resultado gravado em {args.out}")
+
+
+def cmd_compare(args):
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    regressions = []
+
+    def delta(a, b):
+        return None if not a or b is None else (b - a) / a * 100
+
+    print(f"{'métrica':<28} {'base':>10} {'novo':>10} {'Δ%':>8}")
+    for key in ("create_rps", "completed_rps"):
+        a, b = base["throughput"][key], new["throughput"][key]
+        d = delta(a, b)
+        flag = d is not None and d < -args.max_throughput_drop
+        if flag:
+            regressions.append(f"throughput {key} caiu {-d:.1f}%")
+        print(f"{key:<28} {a:>10.1f} {b:>10.1f} {fmt(d):>8}{'  <- REGRESSÃO' if flag else ''}")
+    for stage in STAGES:
+        sa, sb = base["stages"].get(stage, {}), new["stages"].get(stage, {})
+        if not sa.get("count") or not sb.get("count"):
+            continue
+        for p in ("p50", "p99"):
+            d = delta(sa[p], sb[p])
+            flag = p == "p99" and d is not None and d > args.max_p99_increase
+            if flag:
+                regressions.append(f"{stage} p99 subiu {d:.1f}%")
+            print(f"{stage + ' ' + p + ' (ms)':<28} {fmt(sa[p]):>10} {fmt(sb[p]):>10} {fmt(d):>8}"
+                  f"{'  <- REGRESSÃO' if flag else ''}")
+    for key in ("errors", "timeouts", "skipped"):
+        a, b = base["counts"][key], new["counts"][key]
+        print(f"{key:<28} {a:>10} {b:>10}")
+
+    if regressions:
+        print("\nRegressões: " + "; ".join(regressions))
+        sys.exit(1)
+    print("\nSem regressões acima dos limites.")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark open-loop do fluxo Order -> RabbitMQ -> Payment -> Order")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="Gera carga numa taxa fixa e grava os resultados em JSON")
+    r.add_argument("--order-base-url", default="http://localhost:8001", help="Base URL do service_order")
+    r.add_argument("--rps", type=float, default=50, help="Taxa de chegada (req/s); início da rampa/degraus")
+    r.add_argument("--duration", type=float, default=30, help="Duração da geração de carga (s)")
+    r.add_argument("--profile", choices=["const", "ramp", "step"], default="const")
+    r.add_argument("--rps-end", type=float, help="Taxa final do perfil ramp")
+    r.add_argument("--step-rps", type=float, default=50, help="Incremento de taxa a cada degrau (perfil step)")
+    r.add_argument("--step-every", type=float, default=10, help="Duração (s) de cada degrau (perfil step)")
+    r.add_argument("--arrivals", choices=["uniform", "poisson"], default="uniform",
+                   help="Intervalos fixos ou exponenciais entre chegadas")
+    r.add_argument("--max-inflight", type=int, default=2000, help="Pedidos em andamento antes de descartar chegadas")
+    r.add_argument("--fail-rate", type=float, default=0.1, help="Probabilidade (0..1) de gerar amount_cents=0 (falha)")
+    r.add_argument("--timeout-sec", type=float, default=10.0, help="Timeout para o pedido atingir estado final")
+    r.add_argument("--mode", choices=["poll", "wait"], default="wait",
+                   help="wait: long-poll (precisão de ms); poll: GET a cada 200 ms")
+    r.add_argument("--wait-sec", type=float, default=5.0, help="Tempo máximo de cada long-poll no modo wait")
+    r.add_argument("--window", type=float, default=1.0, help="Janela (s) da série temporal no JSON")
+    r.add_argument("--digits", type=int, default=3, help="Dígitos significativos dos histogramas")
+    r.add_argument("--out", help="Arquivo JSON de saída")
+    r.set_defaults(func=cmd_run)
+
+    c = sub.add_parser("compare", help="Compara dois resultados e sai com código 1 se houver regressão")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--max-throughput-drop", type=float, default=5.0, help="Queda máxima aceita de req/s (%%)")
+    c.add_argument("--max-p99-increase", type=float, default=10.0, help="Aumento máximo aceito do p99 (%%)")
+    c.set_defaults(func=cmd_compare)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "service_order"))
+
+import partitioning
+from models import engine
+
+
+def cmd_list(args):
+    with engine.connect() as conn:
+        if not partitioning.is_partitioned(conn):
+            print("tabela orders não é particionada (use o subcomando migrate)")
+            return
+        parts = partitioning.list_partitions(conn)
+    candidates = set(partitioning.archive_candidates(retention_days=args.retention_days))
+    print(f"{'partição':<20} {'de':<12} {'até':<12} {'linhas~':>10} {'MB':>9}  ")
+    for p in parts:
+        flag = "arquivar" if p["name"] in candidates else ("detach pendente" if p["detach_pending"] else "")
+        print(f"{p['name']:<20} {p['start']:%Y-%m-%d}   {p['end']:%Y-%m-%d}   {p['rows_estimate']:>10} "
+              f"{p['bytes'] / 1e6:>9.1f}  {flag}")
+
+
+def cmd_ensure(args):
+    created = partitioning.ensure_partitions(ahead=args.ahead)
+    print("Criadas: " + (", ".join(created) if created else "nenhuma"))
+
+
+def cmd_archive(args):
+    names = partitioning.archive_candidates(retention_days=args.retention_days)
+    if args.dry_run:
+        print("Seriam arquivadas: " + (", ".join(names) if names else "nenhuma"))
+        return
+    for name in names:
+        print(f"{name} -> {partitioning.archive_partition(name, args.mode)}")
+    print(f"Arquivadas: {len(names)}")
+
+
+def cmd_migrate(args):
+    copied = partitioning.migrate()
+    print(f"Linhas copiadas: {copied}" if copied else "Nada a fazer: orders já é particionada ou está vazia")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Partições de tempo da tabela orders (Postgres)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("list", help="Lista as partições com tamanho e o que já passou da retenção")
+    p.add_argument("--retention-days", type=int, default=partitioning.ORDERS_RETENTION_DAYS)
+    p = sub.add_parser("ensure", help="Cria a partição atual e as próximas")
+    p.add_argument("--ahead", type=int, default=partitioning.ORDERS_PARTITIONS_AHEAD, help="Períodos à frente")
+    p = sub.add_parser("archive", help="Arquiva as partições mais antigas que a retenção")
+    p.add_argument("--retention-days", type=int, default=partitioning.ORDERS_RETENTION_DAYS)
+    p.add_argument("--mode", choices=["detach", "export"], default=partitioning.ORDERS_ARCHIVE_MODE,
+                   help="detach: move para o schema de arquivo; export: .csv.gz em ORDERS_ARCHIVE_DIR e DROP")
+    p.add_argument("--dry-run", action="store_true", help="Só mostra o que seria arquivado")
+    sub.add_parser("migrate", help="Converte uma tabela orders antiga (sem partições), com os serviços parados")
+    args = ap.parse_args()
+
+    if not partitioning.enabled():
+        print("Particionamento desligado (ORDERS_PARTITIONING=false ou banco não é Postgres).")
+        sys.exit(1)
+    {"list": cmd_list, "ensure": cmd_ensure, "archive": cmd_archive, "migrate": cmd_migrate}[args.cmd](args)
+
+
+if __name__ == "__main__":
+    main()
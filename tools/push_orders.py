@@ -1,41 +1,59 @@
-import argparse, asyncio, random, string
-import httpx
-
-ITEMS = [
-    "Curso Flask Pro", "Python Essencial", "Arquitetura de Microsserviços",
-    "RabbitMQ do Zero", "FastAPI Hands-on", "SQL Performance"
-]
-
-def rand_suffix(n=6):
-    import secrets
-    alphabet = string.ascii_lowercase + string.digits
-    return "".join(secrets.choice(alphabet) for _ in range(n))
-
-def pick_item(): return random.choice(ITEMS)
-def pick_amount(): return random.choice([1990, 4990, 9900, 12900])
-
-async def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--order-base-url", default="http://localhost:8001")
-    ap.add_argument("--total", type=int, default=50)
-    ap.add_argument("--concurrency", type=int, default=10)
-    args = ap.parse_args()
-
-    sem = asyncio.Semaphore(args.concurrency)
-    async with httpx.AsyncClient() as client:
-        async def one():
-            async with sem:
-                payload = {
-                    "customer_name": f"Vitor-{rand_suffix()}",
-                    "item": pick_item(),
-                    "amount_cents": pick_amount()
-                }
-                r = await client.post(f"{args.order_base_url}/orders", json=payload, timeout=5.0)
-                ok = "OK" if r.status_code == 201 else f"ERR({r.status_code})"
-                return ok
-
-        results = await asyncio.gather(*[one() for _ in range(args.total)])
-    print(f"Criados: {results.count('OK')}/{len(results)}")
-
-if __name__ == "__main__":
-    asyncio.run(main())
+import argparse, asyncio, random, string, time
+import httpx
+
+ITEMS = [
+    "Curso Flask Pro", "Python Essencial", "Arquitetura de Microsserviços",
+    "RabbitMQ do Zero", "FastAPI Hands-on", "SQL Performance"
+]
+
+def rand_suffix(n=6):
+    import secrets
+    alphabet = string.ascii_lowercase + string.digits
+    return "".join(secrets.choice(alphabet) for _ in range(n))
+
+def pick_item(): return random.choice(ITEMS)
+def pick_amount(): return random.choice([1990, 4990, 9900, 12900])
+
+def new_order():
+    return {
+        "customer_name": f"Vitor-{rand_suffix()}",
+        "item": pick_item(),
+        "amount_cents": pick_amount()
+    }
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--order-base-url", default="http://localhost:8001")
+    ap.add_argument("--total", type=int, default=50)
+    ap.add_argument("--concurrency", type=int, default=10)
+    ap.add_argument("--batch-size", type=int, default=1,
+                    help="Pedidos por requisição; >1 usa POST /orders:batch (máx. ORDER_BATCH_MAX do serviço)")
+    args = ap.parse_args()
+
+    sem = asyncio.Semaphore(args.concurrency)
+    async with httpx.AsyncClient() as client:
+        async def one():
+            async with sem:
+                r = await client.post(f"{args.order_base_url}/orders", json=new_order(), timeout=5.0)
+                return 1 if r.status_code == 201 else 0
+
+        async def batch(n):
+            async with sem:
+                r = await client.post(f"{args.order_base_url}/orders:batch",
+                                      json=[new_order() for _ in range(n)], timeout=30.0)
+                if r.status_code not in (201, 207):
+                    return 0
+                return r.json()["created"]
+
+        t0 = time.perf_counter()
+        if args.batch_size > 1:
+            sizes = [min(args.batch_size, args.total - i) for i in range(0, args.total, args.batch_size)]
+            results = await asyncio.gather(*[batch(n) for n in sizes])
+        else:
+            results = await asyncio.gather(*[one() for _ in range(args.total)])
+        elapsed = time.perf_counter() - t0
+    created = sum(results)
+    print(f"Criados: {created}/{args.total} em {elapsed:.2f}s ({created / elapsed:.0f} pedidos/s)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
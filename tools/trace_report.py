@@ -0,0 +1,48 @@
+import argparse, json
+from collections import defaultdict
+
+
+def pct(values, p):
+    if not values:
+        return None
+    k = max(0, min(len(values) - 1, int(round((p / 100) * len(values))) - 1))
+    return values[k]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Quebra de latência por etapa a partir dos spans exportados (TRACE_EXPORT=<arquivo>.jsonl)")
+    ap.add_argument("files", nargs="+", help="Arquivos JSONL dos serviços (ex.: traces_order.jsonl traces_payment.jsonl)")
+    args = ap.parse_args()
+
+    spans = []
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            spans.extend(json.loads(line) for line in f if line.strip())
+
+    by_stage = defaultdict(list)
+    by_trace = defaultdict(list)
+    for s in spans:
+        by_stage[(s["service"], s["name"])].append(s["duration_ms"])
+        by_trace[s["trace_id"]].append(s)
+
+    print(f"{'serviço':<16} {'etapa':<34} {'n':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'média':>9}")
+    for (service, name), values in sorted(by_stage.items()):
+        values.sort()
+        print(f"{service:<16} {name:<34} {len(values):>7} {pct(values, 50):>9.2f} {pct(values, 95):>9.2f} "
+              f"{pct(values, 99):>9.2f} {sum(values) / len(values):>9.2f}")
+
+    e2e = []
+    for trace in by_trace.values():
+        if len(trace) < 2:
+            continue
+        start = min(s["start"] for s in trace)
+        end = max(s["start"] + s["duration_ms"] / 1000 for s in trace)
+        e2e.append((end - start) * 1000)
+    e2e.sort()
+    if e2e:
+        print(f"\nE2E por trace (ms)  : n={len(e2e)}  p50={pct(e2e, 50):.1f}  p95={pct(e2e, 95):.1f}  "
+              f"p99={pct(e2e, 99):.1f}  max={e2e[-1]:.1f}")
+
+
+if __name__ == "__main__":
+    main()